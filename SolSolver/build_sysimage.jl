@@ -0,0 +1,15 @@
+# Builds a precompiled system image with SolSolver baked in, so the game
+# doesn't have to wait for Julia to compile the solver. Needs PackageCompiler:
+#     julia -e 'using Pkg; Pkg.add("PackageCompiler")'
+#     julia SolSolver/build_sysimage.jl
+# The game picks up SolSolver/SolSolver.so automatically (or set SOLSOLVER_SYSIMAGE to its path).
+using PackageCompiler
+
+const PROJECT = @__DIR__
+
+create_sysimage(
+    ["SolSolver"];
+    project=PROJECT,
+    sysimage_path=joinpath(PROJECT, "SolSolver.so"),
+    precompile_execution_file=joinpath(PROJECT, "precompile.jl"),
+)
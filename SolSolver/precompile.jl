@@ -0,0 +1,12 @@
+# Solved while building the system image (see build_sysimage.jl), so the solver is compiled in advance
+using SolSolver
+
+SolSolver.solve([
+    8 8 1 1 1 8 8
+    8 8 1 1 1 8 8
+    1 1 1 1 1 1 1
+    1 1 1 0 1 1 1
+    1 1 1 1 1 1 1
+    8 8 1 1 1 8 8
+    8 8 1 1 1 8 8
+])
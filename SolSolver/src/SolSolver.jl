@@ -38,57 +38,192 @@ function find_moves(grid::Matrix{Int64})
     return results
 end
 
-function check_similar(board::Matrix{Int64}, boards_seen::Set{Any})
-    board in boards_seen ||
-    rotl90(board) in boards_seen || 
-    rotr90(board) in boards_seen ||
-    rot180(board) in boards_seen || 
-    transpose(board) in boards_seen ||
-    rotl90(transpose(board)) in boards_seen ||
-    rotr90(transpose(board)) in boards_seen ||
-    rot180(transpose(board)) in boards_seen
+# The holes of the board, numbered row-major (the same numbering as bitboard.py in the Python code)
+const LAYOUT = [
+    8 8 1 1 1 8 8
+    8 8 1 1 1 8 8
+    1 1 1 1 1 1 1
+    1 1 1 1 1 1 1
+    1 1 1 1 1 1 1
+    8 8 1 1 1 8 8
+    8 8 1 1 1 8 8
+]
+const HOLES = [(r, c) for r in 1:size(LAYOUT, 1) for c in 1:size(LAYOUT, 2) if LAYOUT[r, c] != 8]
+const HOLE_INDEX = Dict(loc => i for (i, loc) in enumerate(HOLES))
+
+# The 8 rotations / reflections of the board, as permutations of the holes:
+# SYMMETRIES[k][i] is where hole i ends up under symmetry k
+const SYMMETRIES = let n = size(LAYOUT, 1) + 1
+    transforms = [
+        (r, c) -> (r, c),
+        (r, c) -> (n - c, r),
+        (r, c) -> (n - r, n - c),
+        (r, c) -> (c, n - r),
+        (r, c) -> (c, r),
+        (r, c) -> (n - r, c),
+        (r, c) -> (n - c, n - r),
+        (r, c) -> (r, n - c),
+    ]
+    [[HOLE_INDEX[t(r, c)] for (r, c) in HOLES] for t in transforms]
 end
 
-function solve(board::Matrix{Int64})
-    # print(board)
-    full_history = []
-    boards_seen = Set()
-    moves = 0
-    n_duplicate_boards = 0
-    function depth_first(history::AbstractVector, nmarbles::Integer)
-        for new_grid in find_moves(history[end])
-            moves += 1
-            if sum(new_grid .== 1) == nmarbles
-                push!(history, new_grid)
-                full_history = history
-                return true
-            elseif check_similar(new_grid, boards_seen) # seen a similar board, go to next one
-                n_duplicate_boards += 1 
-                continue
+# canonical_key packs the board into the smallest of its 8 symmetric images, so that
+# all rotations / reflections of a board share one key, and the seen-set needs one probe
+function canonical_key(grid::Matrix{Int64})
+    key = typemax(UInt64)
+    for perm in SYMMETRIES
+        k = zero(UInt64)
+        for (i, (r, c)) in enumerate(HOLES)
+            if grid[r, c] == 1
+                k |= one(UInt64) << (perm[i] - 1)
             end
-            history_copy = copy(history)
-            push!(history_copy, new_grid) # Keep track of where we are
-            push!(boards_seen, new_grid) # Add the new board to previously seen boards
-            if depth_first(history_copy, nmarbles)
-                return true
+        end
+        key = min(key, k)
+    end
+    return key
+end
+
+# No board can be solved with fewer pegs than this
+const FLOOR = 1
+# How many moves the solver makes between progress updates
+const PROGRESS_EVERY = 10000
+
+struct SolveCancelled <: Exception end
+
+# SolveStats records what the solver did, and is returned alongside the solution
+# (the same fields as stats.py in the Python code, which builds its own SolveStats from it).
+# nodes_per_depth[d] is the moves made from boards d-1 moves away from the start, and
+# seen_sizes holds (moves, boards seen) samples, taken every progress_every moves.
+mutable struct SolveStats
+    moves::Int
+    duplicates::Int
+    nodes_per_depth::Vector{Int}
+    seen_sizes::Vector{Tuple{Int, Int}}
+    iteration_times::Vector{Tuple{Int, Float64}}
+    elapsed::Float64
+    peak_seen_bytes::Int
+    peak_rss_mb::Float64
+end
+SolveStats() = SolveStats(0, 0, zeros(Int, length(HOLES)), Tuple{Int, Int}[], Tuple{Int, Float64}[], 0.0, 0, 0.0)
+
+# report updates the status shared with the caller. If it has room, status[3] gets the duplicate count.
+function report(status::AbstractVector{<:Integer}, stats::SolveStats)
+    status[1] = stats.moves
+    if length(status) >= 3
+        status[3] = stats.duplicates
+    end
+end
+
+# solve makes a single exhaustive DFS pass, working out the fewest pegs that can be left
+# from every board it finishes. best_seen maps the canonical key of each finished board
+# to that peg count, so a board seen before (in any orientation) is never searched again.
+# status is shared with the caller (e.g. a numpy array, from Python): status[1] is kept up
+# to date with the number of moves made, and setting status[2] to non-zero cancels the solve.
+# When the solve finishes, status[1] (and status[3], see report) hold the final counts.
+# progress, if given, is called with the SolveStats every progress_every moves, and can
+# return true to stop the solve, as if it had been cancelled.
+# Returns the list of grids (empty if no move can be made, or if cancelled), and the SolveStats.
+function solve(board::Matrix{Int64}, status::AbstractVector{<:Integer}=zeros(Int64, 2);
+               progress=nothing, progress_every::Int=PROGRESS_EVERY)
+    started = time()
+    stats = SolveStats()
+    best_seen = Dict{UInt64, Int}()
+    function best_reachable(grid::Matrix{Int64}, depth::Int)
+        best = sum(grid .== 1)
+        for new_grid in find_moves(grid)
+            stats.moves += 1
+            stats.nodes_per_depth[depth] += 1
+            if stats.moves % progress_every == 0
+                push!(stats.seen_sizes, (stats.moves, length(best_seen)))
+                report(status, stats)
+                status[2] != 0 && throw(SolveCancelled())
+                progress !== nothing && progress(stats) && throw(SolveCancelled())
+            end
+            key = canonical_key(new_grid)
+            value = get(best_seen, key, 0)
+            if value == 0
+                value = best_reachable(new_grid, depth + 1)
+                best_seen[key] = value
+            else # seen a similar board, so we already know how well it does
+                stats.duplicates += 1
+            end
+            best = min(best, value)
+            if best == FLOOR # nothing can do better, so stop searching
+                break
             end
         end
-        return false
+        return best
+    end
+    npegs = try
+        best_reachable(board, 1)
+    catch e
+        e isa SolveCancelled || rethrow()
+        return [], stats
     end
-    for npegs in 1:20
-        full_history = []
-        boards_seen = Set()
-        moves = 0
-        n_duplicate_boards = 0
-        sol = depth_first([board], npegs)
-        if sol
-            println("Best solution: $npegs pegs. No. of moves made to find this: $moves. No. of unique boards seen: $(moves - n_duplicate_boards)")
-            return full_history
+    stats.elapsed = time() - started
+    push!(stats.iteration_times, (npegs, stats.elapsed))
+    push!(stats.seen_sizes, (stats.moves, length(best_seen)))
+    stats.peak_seen_bytes = Base.summarysize(best_seen)
+    stats.peak_rss_mb = Sys.maxrss() / 2^20
+    report(status, stats)
+    if npegs == sum(board .== 1) # no moves could be made
+        return [], stats
+    end
+    # Now walk back down from the start, always taking a move to a board that does as well
+    full_history = [board]
+    while sum(full_history[end] .== 1) > npegs
+        for new_grid in find_moves(full_history[end])
+            if get(best_seen, canonical_key(new_grid), 0) == npegs
+                push!(full_history, new_grid)
+                break
+            end
         end
     end
-    return []
+    return full_history, stats
+end
+
+# pack / unpack convert between a grid and a board packed into a single integer,
+# with bit i-1 set if hole i has a peg in it (the same packing as bitboard.py in the Python code)
+function pack(grid::Matrix{Int64})
+    bits = zero(UInt64)
+    for (i, (r, c)) in enumerate(HOLES)
+        if grid[r, c] == 1
+            bits |= one(UInt64) << (i - 1)
+        end
+    end
+    return bits
+end
+
+function unpack(bits::Integer)
+    grid = copy(LAYOUT)
+    for (i, (r, c)) in enumerate(HOLES)
+        grid[r, c] = (bits >> (i - 1)) & 1
+    end
+    return grid
+end
+
+# find_move returns the (from, over, to) holes of the move between two grids
+function find_move(before::Matrix{Int64}, after::Matrix{Int64})
+    changed = [i for (i, (r, c)) in enumerate(HOLES) if before[r, c] != after[r, c]]
+    to = only(i for i in changed if after[HOLES[i]...] == 1)
+    distance(i) = sum(abs.(HOLES[i] .- HOLES[to]))
+    from = only(i for i in changed if distance(i) == 2)
+    over = only(i for i in changed if distance(i) == 1)
+    return (from, over, to)
+end
+
+# solve_packed is solve for callers that don't want to send (or get back) whole grids.
+# It takes a packed board, and returns the solution as a matrix with one (from, over, to)
+# row per move. Holes are numbered from 0, to match bitboard.py. The SolveStats come back with it.
+function solve_packed(bits::Integer, status::AbstractVector{<:Integer}=zeros(Int64, 2); kwargs...)
+    history, stats = solve(unpack(bits), status; kwargs...)
+    moves = Matrix{Int64}(undef, max(length(history) - 1, 0), 3)
+    for i in 1:size(moves, 1)
+        moves[i, :] .= find_move(history[i], history[i + 1]) .- 1
+    end
+    return moves, stats
 end
 
-export solve
+export solve, solve_packed, SolveStats
 
 end # module SolSolver
@@ -0,0 +1,142 @@
+import argparse
+import json
+import multiprocessing as mp
+import sys
+import threading
+import functools
+import numpy as np
+from geometry import LAYOUTS, get_geometry
+from bitboard import count_pegs
+from worker import python_solve, MOVES, CANCEL
+
+# Solves boards from the command line, without the window (so without Tk, or a display), e.g.:
+#     python -m batch boards.txt --timeout 60 > results.jsonl
+#     cat boards.txt | python -m batch --workers 4
+#
+# Each line of the input is one board, either as text (see bitboard.py), e.g.
+#     ooo/ooo/ooooooo/ooo.ooo/ooooooo/ooo/ooo
+# or as JSON, with the board as text or as the packed int, and an optional id:
+#     {"id": "start", "board": "ooo/ooo/ooooooo/ooo.ooo/ooooooo/ooo/ooo"}
+#     {"bits": 8589869055}
+# Blank lines, and lines starting with #, are skipped.
+#
+# Boards are solved in a pool of worker processes, and each result is written out as a line of
+# JSON as soon as it is ready (so not necessarily in input order; the id says which board it is):
+#     {"id": ..., "board": ..., "status": "ok", "start_pegs": 32, "pegs": 1, "moves": [[4, 9, 16], ...], "stats": {...}}
+# moves are (from, over, to) hole numbers, counting row by row from the top left (see bitboard.HOLES).
+# status is "timeout" if the board wasn't solved in time, or "error" if it couldn't be read.
+#
+# --layout solves boards on another layout (see geometry.py), with the text written the same way,
+# e.g. ./oo/ooo/oooo/ooooo for the triangle. Julia only knows the English board.
+ENGINES = ("python", "numpy", "julia")
+
+_solve = None
+_geometry = None
+
+
+def _init_worker(engine, layout="english"):
+    global _solve, _geometry
+    _geometry = get_geometry(layout)
+    _solve = functools.partial(python_solve, geometry=_geometry)
+    if engine == "numpy":
+        from frontier import numpy_solve
+        _solve = functools.partial(numpy_solve, geometry=_geometry)
+    if engine == "julia" and layout == "english":
+        import julia_engine
+        julia_engine.start()
+        if julia_engine.wait():
+            _solve = julia_engine.solve
+
+
+# read_boards yields (line number, line) for each board in lines. Lines are only parsed by the workers,
+# so a bad line is reported in its result, rather than stopping the batch.
+def read_boards(lines):
+    for number, line in enumerate(lines, 1):
+        line = line.strip()
+        if line and not line.startswith("#"):
+            yield number, line
+
+
+# parse_board returns the (id, packed board) on a line, raising ValueError if it isn't a board
+def parse_board(line: str, geometry):
+    if not line.startswith("{"):
+        return None, geometry.text_to_bits(line)
+    board = json.loads(line)
+    if "bits" in board:
+        bits = int(board["bits"], 0) if isinstance(board["bits"], str) else board["bits"]
+        if not isinstance(bits, int) or isinstance(bits, bool) or not 0 <= bits <= geometry.full:
+            raise ValueError(f"Not a board: bits {board['bits']!r}. Expected an int from 0 to {geometry.full}")
+        return board.get("id"), bits
+    if not isinstance(board["board"], str):
+        raise ValueError(f"Not a board: {board['board']!r}. Expected text, e.g. {geometry.bits_to_text(geometry.start)}")
+    return board.get("id"), geometry.text_to_bits(board["board"])
+
+
+# solve_line solves the board on one line of the input, giving up after timeout seconds (if given)
+def solve_line(job) -> dict:
+    number, line, timeout = job
+    geometry = _geometry
+    result = {"id": number, "board": line}
+    try:
+        board_id, bits = parse_board(line, geometry)
+        if board_id is not None:
+            result["id"] = board_id
+        result.update(board=geometry.bits_to_text(bits), start_pegs=count_pegs(bits))
+    except (ValueError, TypeError, KeyError) as e:
+        result.update(status="error", error=str(e))
+        return result
+
+    status = np.zeros(3, dtype=np.int64)
+    timer = None
+    if timeout:
+        # Cancelling through the status array works for both engines, like the window's Cancel button
+        timer = threading.Timer(timeout, status.__setitem__, (CANCEL, 1))
+        timer.start()
+    try:
+        solution, stats = _solve(geometry.bits_to_grid(bits), status)
+    finally:
+        if timer:
+            timer.cancel()
+    if stats is None:
+        result.update(status="timeout", moves_made=int(status[MOVES]))
+        return result
+    boards = [geometry.grid_to_bits(grid) for grid in solution]
+    result.update(
+        status="ok",
+        pegs=count_pegs(boards[-1]) if boards else count_pegs(bits),
+        moves=geometry.moves_between(boards),
+        stats=stats.to_dict(),
+    )
+    return result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Solve peg solitaire boards in bulk, writing JSON lines")
+    parser.add_argument("input", nargs="?", default="-", help="file of boards, one per line (default: stdin)")
+    parser.add_argument("--output", help="file to write the results to (default: stdout)")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (default: all the cores)")
+    parser.add_argument("--timeout", type=float, default=None, help="seconds allowed per board")
+    parser.add_argument("--engine", choices=ENGINES, default="python",
+                        help="solver to use (numpy is breadth first, see frontier.py). "
+                             "julia falls back on python if Julia can't be started")
+    parser.add_argument("--layout", choices=list(LAYOUTS), default="english",
+                        help="board layout of the input (julia only solves the english board)")
+    args = parser.parse_args(argv)
+
+    source = sys.stdin if args.input == "-" else open(args.input)
+    out = open(args.output, "w") if args.output else sys.stdout
+    jobs = ((number, line, args.timeout) for number, line in read_boards(source))
+    try:
+        with mp.Pool(args.workers, initializer=_init_worker, initargs=(args.engine, args.layout)) as pool:
+            for result in pool.imap_unordered(solve_line, jobs):
+                out.write(json.dumps(result) + "\n")
+                out.flush()
+    finally:
+        if source is not sys.stdin:
+            source.close()
+        if out is not sys.stdout:
+            out.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,258 @@
+import argparse
+import csv
+import functools
+import json
+import multiprocessing as mp
+import os
+import random
+import signal
+import sys
+import time
+try:
+    import resource
+except ImportError: # Windows has no resource module, so peak memory isn't measured there (as in stats.py)
+    resource = None
+import numpy as np
+from constants import SOLITAIRE1
+from geometry import ENGLISH, LAYOUTS, get_geometry
+from bitboard import count_pegs
+from worker import python_solve
+
+# A reproducible benchmark of the solver engines. It runs every engine on the same seeded
+# corpus of boards, each run in a fresh process with a time budget, e.g.:
+#     python -m benchmark --budget 60 --output results.json
+#     python -m benchmark --baseline results.json      (to check for regressions)
+#
+# The corpus starts with SOLITAIRE and SOLITAIRE1, followed by boards reached by playing random
+# moves from SOLITAIRE. The fewer moves played, the bigger (and more lopsided) the search.
+# With --layout (see geometry.py) the corpus is the layout's start, and random boards played
+# from it. Only the python engines solve other layouts.
+DEFAULT_DEPTHS = (4, 8, 12, 16)
+DEFAULT_PER_DEPTH = 3
+DEFAULT_BUDGET = 60 # seconds per run, not counting the engine's start up
+STARTUP_TIMEOUT = 600 # seconds for an engine to start (Julia can take a while the first time)
+DEFAULT_TOLERANCE = 0.2 # how much slower than the baseline counts as a regression
+MIN_SLOWDOWN = 0.05 # seconds. Smaller differences are just noise.
+
+# The columns of the results. JSON results also keep the engine's full SolveStats (see stats.py).
+FIELDS = ("engine", "board", "bits", "start_pegs", "status", "best_pegs", "wall_s",
+          "nodes", "nodes_per_s", "duplicates", "duplicate_rate", "peak_rss_mb")
+
+
+def make_corpus(seed=0, depths=DEFAULT_DEPTHS, per_depth=DEFAULT_PER_DEPTH, geometry=ENGLISH) -> list:
+    rng = random.Random(seed)
+    start = geometry.start
+    if geometry is ENGLISH:
+        corpus = [("SOLITAIRE", start), ("SOLITAIRE1", ENGLISH.grid_to_bits(SOLITAIRE1))]
+    else:
+        corpus = [(geometry.name, start)]
+    for depth in depths:
+        for i in range(per_depth):
+            bits = start
+            for _ in range(depth):
+                children = geometry.find_children(bits)
+                if not children:
+                    break
+                bits = rng.choice(children)
+            corpus.append((f"random-{depth}-{i}", bits))
+    return corpus
+
+
+# Engines are loaded in the benchmark's child process, and return a solve(grid, status)
+# function, in the same shape as the window's solvers (see worker.py).
+def _load_python(geometry):
+    return functools.partial(python_solve, geometry=geometry)
+
+def _load_python_npegs(geometry):
+    return functools.partial(python_solve, single_pass=False, geometry=geometry)
+
+def _load_numpy(geometry):
+    from frontier import numpy_solve
+    return functools.partial(numpy_solve, geometry=geometry)
+
+def _load_numpy_beam(geometry):
+    from frontier import numpy_solve, BEAM_WIDTH
+    return functools.partial(numpy_solve, beam_width=BEAM_WIDTH, geometry=geometry)
+
+def _english_only(geometry):
+    if geometry is not ENGLISH:
+        raise RuntimeError(f"only solves the english layout, not {geometry.name}")
+
+def _load_parallel(geometry):
+    _english_only(geometry)
+    from parallel import solve_parallel
+    return lambda grid, status: solve_parallel(grid)
+
+def _load_julia(geometry):
+    _english_only(geometry)
+    import julia_engine
+    julia_engine.start()
+    if not julia_engine.wait():
+        raise RuntimeError(f"Julia is unavailable: {julia_engine.error}")
+    return julia_engine.solve
+
+ENGINES = {
+    "python": _load_python,
+    "python-npegs": _load_python_npegs,
+    "numpy": _load_numpy,
+    "numpy-beam": _load_numpy_beam,
+    "parallel": _load_parallel,
+    "julia": _load_julia,
+}
+# Engines whose move count changes from run to run. The parallel workers race to fill the shared
+# best result, so how much each one searches depends on timing. Only their wall time is compared.
+NONDETERMINISTIC = {"parallel"}
+
+
+def _run_child(engine, bits, conn, layout="english"):
+    if hasattr(os, "setpgrp"): # so a run over budget can be killed along with any processes it started
+        os.setpgrp()
+    # Julia (and juliacall's package manager) can print to stdout while it loads, which would end up
+    # in the results when they are written to stdout. So the child's stdout goes to devnull, at the
+    # file descriptor, to catch Julia's own writes as well as Python's.
+    devnull = os.open(os.devnull, os.O_WRONLY)
+    os.dup2(devnull, sys.stdout.fileno())
+    os.close(devnull)
+    geometry = get_geometry(layout)
+    try:
+        solve = ENGINES[engine](geometry)
+    except Exception as e:
+        conn.send({"status": "unavailable", "error": str(e)})
+        return
+    conn.send("ready")
+    status = np.zeros(3, dtype=np.int64)
+    started = time.perf_counter()
+    solution, stats = solve(geometry.bits_to_grid(bits), status)
+    wall = time.perf_counter() - started
+    conn.send({
+        "status": "ok",
+        "best_pegs": int(np.sum(solution[-1] == 1)) if solution else count_pegs(bits),
+        "wall_s": wall,
+        "nodes": stats.moves,
+        "duplicates": stats.duplicates,
+        "duplicate_rate": stats.duplicate_rate(),
+        "stats": stats.to_dict(),
+        "peak_rss_mb": max(resource.getrusage(who).ru_maxrss
+                           for who in (resource.RUSAGE_SELF, resource.RUSAGE_CHILDREN)) / 1024
+                       if resource else stats.peak_rss_mb,
+    })
+
+
+# run_one runs an engine on one board in a fresh process, so each run gets a clean memory
+# measurement, and a run over budget can simply be killed
+def run_one(engine, name, bits, budget=DEFAULT_BUDGET, layout="english") -> dict:
+    row = dict.fromkeys(FIELDS)
+    row.update(engine=engine, board=name, bits=hex(bits), start_pegs=count_pegs(bits))
+    parent, child = mp.Pipe(duplex=False)
+    process = mp.Process(target=_run_child, args=(engine, bits, child, layout))
+    process.start()
+    try:
+        if not parent.poll(STARTUP_TIMEOUT):
+            row["status"] = "timeout"
+            return row
+        message = parent.recv()
+        if message != "ready":
+            row["status"] = message["status"]
+            return row
+        if not parent.poll(budget):
+            row["status"] = "timeout"
+            return row
+        row.update(parent.recv())
+    except EOFError: # the child died without reporting back
+        row["status"] = "error"
+        return row
+    finally:
+        if hasattr(os, "killpg"):
+            try:
+                os.killpg(process.pid, signal.SIGKILL)
+            except ProcessLookupError:
+                pass
+        else: # no process groups (Windows), so only the run itself can be killed
+            process.kill()
+        process.join()
+    row.pop("error", None)
+    if row["wall_s"]:
+        row["nodes_per_s"] = row["nodes"] / row["wall_s"]
+    return row
+
+
+def run(engines, corpus, budget=DEFAULT_BUDGET, layout="english") -> list:
+    rows = []
+    for engine in engines:
+        for (name, bits) in corpus:
+            row = run_one(engine, name, bits, budget, layout)
+            print(f"{engine:>12} {name:>12}: {row['status']:>11} {row['wall_s'] or 0:8.3f}s "
+                  f"{row['nodes'] or 0:>10} moves", file=sys.stderr)
+            rows.append(row)
+    return rows
+
+
+def write(rows, path=None, fmt="json"):
+    out = open(path, "w", newline="") if path else sys.stdout
+    try:
+        if fmt == "csv":
+            writer = csv.DictWriter(out, fieldnames=FIELDS, extrasaction="ignore")
+            writer.writeheader()
+            writer.writerows(rows)
+        else:
+            json.dump(rows, out, indent=1)
+            out.write("\n")
+    finally:
+        if path:
+            out.close()
+
+
+# compare returns a description of every run that got worse than in the baseline:
+# it stopped finishing, it found a worse result, it made more moves (for engines that always
+# make the same moves), or it got slower
+def compare(rows, baseline, tolerance=DEFAULT_TOLERANCE) -> list:
+    previous = {(row["engine"], row["bits"]): row for row in baseline}
+    regressions = []
+    for row in rows:
+        old = previous.get((row["engine"], row["bits"]))
+        if old is None or old["status"] != "ok":
+            continue
+        label = f"{row['engine']} on {row['board']}"
+        if row["status"] != "ok":
+            regressions.append(f"{label}: {row['status']} (was ok in {old['wall_s']:.3f}s)")
+            continue
+        if row["best_pegs"] > old["best_pegs"]:
+            regressions.append(f"{label}: best {row['best_pegs']} pegs (was {old['best_pegs']})")
+        if row["engine"] not in NONDETERMINISTIC and row["nodes"] > old["nodes"]:
+            regressions.append(f"{label}: {row['nodes']} moves (was {old['nodes']})")
+        if row["wall_s"] > old["wall_s"] * (1 + tolerance) and row["wall_s"] - old["wall_s"] > MIN_SLOWDOWN:
+            regressions.append(f"{label}: {row['wall_s']:.3f}s (was {old['wall_s']:.3f}s)")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the peg solitaire solver engines")
+    parser.add_argument("--engines", nargs="+", default=list(ENGINES), choices=list(ENGINES))
+    parser.add_argument("--layout", choices=list(LAYOUTS), default="english",
+                        help="board layout to benchmark on (parallel and julia only solve english)")
+    parser.add_argument("--seed", type=int, default=0, help="seed for the random boards")
+    parser.add_argument("--depths", type=int, nargs="+", default=list(DEFAULT_DEPTHS),
+                        help="how many random moves to play for each group of random boards")
+    parser.add_argument("--per-depth", type=int, default=DEFAULT_PER_DEPTH, help="random boards per depth")
+    parser.add_argument("--budget", type=float, default=DEFAULT_BUDGET, help="seconds allowed per run")
+    parser.add_argument("--format", choices=("json", "csv"), default="json")
+    parser.add_argument("--output", help="file to write the results to (default: stdout)")
+    parser.add_argument("--baseline", help="results (JSON) from an earlier run, to check for regressions")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE,
+                        help="fraction slower than the baseline that counts as a regression")
+    args = parser.parse_args(argv)
+
+    corpus = make_corpus(args.seed, args.depths, args.per_depth, get_geometry(args.layout))
+    rows = run(args.engines, corpus, args.budget, args.layout)
+    write(rows, args.output, args.format)
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(rows, json.load(f), args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}", file=sys.stderr)
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,48 @@
+from geometry import ENGLISH
+
+# A bitboard packs the holes of the board into a single Python int.
+# Holes are numbered row-major, skipping cells that are off the board,
+# so bit i is set if hole i has a peg in it.
+#
+# The tables for each board layout are worked out once, in geometry.py. The names below are the
+# English board's, for the code that only ever plays on it (the window, the tablebase, Julia).
+
+# HOLES maps hole index -> (row, col), and HOLE_INDEX maps (row, col) -> hole index
+HOLES = ENGLISH.holes
+HOLE_INDEX = ENGLISH.hole_index
+N_HOLES = ENGLISH.n_holes
+FULL = ENGLISH.full
+
+# Every possible jump on the board as (from, over, to) hole indices, and as (need, mask) pairs
+# (see geometry.py). MOVE_OF_MASK turns a mask back into its (from, over, to) move.
+JUMPS = ENGLISH.jumps
+JUMP_MASKS = ENGLISH.jump_masks
+MOVE_OF_MASK = ENGLISH.move_of_mask
+
+# The board's 8 symmetries, as permutations of the holes
+SYMMETRIES = ENGLISH.symmetries
+SYMMETRY_TABLES = ENGLISH.symmetry_tables
+
+grid_to_bits = ENGLISH.grid_to_bits
+bits_to_grid = ENGLISH.bits_to_grid
+bits_to_text = ENGLISH.bits_to_text
+text_to_bits = ENGLISH.text_to_bits
+find_jumps = ENGLISH.find_jumps
+find_children = ENGLISH.find_children
+move_of = ENGLISH.move_of
+moves_between = ENGLISH.moves_between
+transform = ENGLISH.transform
+canonical = ENGLISH.canonical
+
+
+def count_pegs(bits: int) -> int:
+    return bin(bits).count("1")
+
+
+# replay returns the boards visited by making the (from, over, to) moves in order, starting from bits
+def replay(bits: int, moves) -> list:
+    boards = [bits]
+    for (f, o, t) in moves:
+        bits ^= (1 << f) | (1 << o) | (1 << t)
+        boards.append(bits)
+    return boards
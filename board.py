@@ -1,15 +1,40 @@
 import numpy as np
 DTYPE = np.dtype("i")
 import random
+import time
+from seentable import SeenTable
+from pruning import Pruning
+from stats import SolveStats
+from geometry import ENGLISH
+from bitboard import count_pegs, replay
+
+# No board can be solved with fewer pegs than this
+FLOOR = 1
+# How many moves the solver makes between progress ticks (see Board.solve)
+PROGRESS_EVERY = 10000
+
+
+class SolveCancelled(Exception):
+    pass
+
 
 class Board():
-    def __init__(self, grid):
+    # max_seen caps how many boards the solver remembers (see seentable.py). By default there is no cap.
+    # pruning sets which bounds and move ordering the solver uses (see pruning.py).
+    # progress_every is how many moves the solver makes between progress ticks.
+    # geometry is the board layout the grid is on (see geometry.py). By default it is the English board.
+    def __init__(self, grid, max_seen=None, pruning=None, progress_every=PROGRESS_EVERY, geometry=None):
         # Data below is for board management and solving
         self.initial_grid = grid
         self.grid = grid
+        self.geometry = ENGLISH if geometry is None else geometry
+        self.max_seen = max_seen
+        self.pruning = Pruning() if pruning is None else pruning
+        self.progress_every = progress_every
         self.solver_history = []
-        self.boards_seen = set()
-        self.moves = 0
+        self.boards_seen = SeenTable(max_seen)
+        self.best_seen = SeenTable(max_seen)
+        self.stats = SolveStats(self.geometry.n_holes)
         self.selected_peg = [0, 0]
         self.available_locs = {}
 
@@ -17,83 +42,226 @@ class Board():
     def reset(self):
         # self.grid = self.initial_grid
         self.solver_history = []
-        self.boards_seen = set()
-        self.moves = 0
+        self.boards_seen = SeenTable(self.max_seen)
+        self.best_seen = SeenTable(self.max_seen)
+        self.stats = SolveStats(self.geometry.n_holes)
     
+    # make_move / unmake_move make (or take back) a (from, over, to) move on the grid, in place
+    def make_move(self, move):
+        (f, o, t) = move
+        holes = self.geometry.holes
+        self.grid[holes[f]] = self.grid[holes[o]] = 0
+        self.grid[holes[t]] = 1
+
+    def unmake_move(self, move):
+        (f, o, t) = move
+        holes = self.geometry.holes
+        self.grid[holes[f]] = self.grid[holes[o]] = 1
+        self.grid[holes[t]] = 0
+
     # find_moves finds all the next boards in 1 move, starting from the current board
+    # The moves are generated on the packed bitboard (see bitboard.py), and only turned
+    # back into grids at the edge, so the window can keep working with numpy grids.
     def find_moves(self) -> list:
-        (rows, cols) = self.grid.shape
-        results = []
-        for r in range(rows):
-            for c in range (cols):
-                if (self.grid[r][c] == 1):
-                    if (r-2 >= 0) and (self.grid[r-1][c] == 1) and (self.grid[r-2][c] == 0):
-                        new_grid = self.grid.copy()
-                        new_grid[r][c] = 0
-                        new_grid[r-1][c] = 0
-                        new_grid[r-2][c] = 1
-                        results.append(Board(new_grid))
-                    if (c+2 < cols) and (self.grid[r][c+1] == 1) and (self.grid[r][c+2] == 0):
-                        new_grid = self.grid.copy()
-                        new_grid[r][c] = 0
-                        new_grid[r][c+1] = 0
-                        new_grid[r][c+2] = 1
-                        results.append(Board(new_grid))
-                    if (r+2 < rows) and (self.grid[r+1][c] == 1) and (self.grid[r+2][c] == 0):
-                        new_grid = self.grid.copy()
-                        new_grid[r][c] = 0
-                        new_grid[r+1][c] = 0
-                        new_grid[r+2][c] = 1
-                        results.append(Board(new_grid))
-                    if (c-2 >= 0) and (self.grid[r][c-1] == 1) and (self.grid[r][c-2] == 0):
-                        new_grid = self.grid.copy()
-                        new_grid[r][c] = 0
-                        new_grid[r][c-1] = 0
-                        new_grid[r][c-2] = 1
-                        results.append(Board(new_grid))
-        return results
-
-    # Using numpy allows for easy rotations to check if the board has been seen before
-    def __check_similar(self, boards_seen: set) -> bool:
-        return (
-            self.grid.data.tobytes() in boards_seen or 
-            np.rot90(self.grid, 1).data.tobytes() in boards_seen or 
-            np.rot90(self.grid, 2).data.tobytes() in boards_seen or
-            np.rot90(self.grid, 3).data.tobytes() in boards_seen or 
-            np.transpose(self.grid).data.tobytes() in boards_seen or
-            np.rot90(np.transpose(self.grid), 1).data.tobytes() in boards_seen or
-            np.rot90(np.transpose(self.grid), 2).data.tobytes() in boards_seen or
-            np.rot90(np.transpose(self.grid), 3).data.tobytes() in boards_seen
-        )
-        
-    def solve(self) -> list:
+        geometry = self.geometry
+        return [Board(geometry.bits_to_grid(child), geometry=geometry)
+                for child in geometry.find_children(geometry.grid_to_bits(self.grid))]
+
+    # The solver works entirely on packed bitboards, and only converts the solution back to grids.
+    # Returns the list of grids (empty if no move can be made), and the SolveStats of the solve
+    # (see stats.py), which are also kept in self.stats.
+    # Every progress_every moves, the solver ticks: it samples the size of its seen tables, and
+    # calls progress (if given) with the stats so far. If progress returns True the search is
+    # abandoned, and SolveCancelled is raised.
+    def solve(self, single_pass=True, progress=None):
+        self.reset()
+        start = self.geometry.grid_to_bits(self.grid)
+        npegs, moves = self.find_solution(start, single_pass, progress)
+        if moves:
+            self.solver_history = [self.geometry.bits_to_grid(bits) for bits in replay(start, moves)]
+        return self.solver_history.copy(), self.stats
+
+    # find_solution returns the best peg count reachable from bits, and the (from, over, to) moves to get there.
+    # By default it makes a single pass, finding the best reachable peg count directly. This keeps
+    # best_seen between calls, so it can be called on many related boards (see parallel.py).
+    # With single_pass=False it searches for 1 peg, then 2 pegs, ... up to 5, forgetting the boards
+    # it has seen each time. The stats add up over all the searches (until reset is called).
+    def find_solution(self, bits: int, single_pass=True, progress=None):
+        stats = self.stats
+        if single_pass:
+            started = time.perf_counter()
+            npegs, moves = self.__search_best(bits, progress)
+            stats.iteration_times.append((npegs, time.perf_counter() - started))
+            self.__finish()
+            return npegs, moves
         for npegs in range(1, 6):
-            self.reset()
-            if self.__solve_r([self], npegs):
-                print(f"Solution found with {npegs} pegs. No. of moves made to find this: ", self.moves)
-                solution = self.solver_history.copy()
-                return solution
-        print("No solution found")
-        return []
-
-    # We use DFS to solve the board. 
-    def __solve_r(self, history: list, npegs: int) -> bool:
-        for new_board in history[-1].find_moves():
-            # print(new_board.grid)
-            self.moves += 1
-            if np.sum(new_board.grid == 1) == npegs:
-                history.append(new_board)
-                self.solver_history = history
-                return True
-            if new_board.__check_similar(self.boards_seen): # seen a similar board, go to next one
-                continue
-            history_copy = history.copy()
-            history_copy.append(new_board) # Keep track of where we are
-            self.boards_seen.add(new_board.grid.data.tobytes()) # Add the new board to previously seen boards
-            if self.__solve_r(history_copy, npegs):
-                return True
-        return False
+            started = time.perf_counter()
+            self.boards_seen = SeenTable(self.max_seen)
+            moves = self.__search(bits, npegs, progress)
+            stats.iteration_times.append((npegs, time.perf_counter() - started))
+            if moves is not None:
+                self.__finish()
+                return npegs, moves
+        self.__finish()
+        return None, []
+
+    # We use DFS to solve the board, without recursion. There is just one board, and
+    # each jump is made (and later unmade) on it with an xor of the jump's mask.
+    # path holds the masks of the jumps made so far, and frames holds, for each board
+    # on the path, an iterator over the jumps still to be tried from it.
+    # Returns the list of (from, over, to) moves that leave npegs pegs, or None.
+    def __search(self, bits: int, npegs: int, progress=None):
+        stats = self.stats
+        nodes = stats.nodes_per_depth
+        canonical = self.geometry.canonical
+        lower_bound = self.pruning.bound_for(bits, self.geometry)
+        start = bits
+        pegs = count_pegs(bits)
+        path = []
+        frames = [iter(self.__jumps(bits))]
+        next_tick = stats.moves + self.progress_every
+        while frames:
+            if stats.moves >= next_tick:
+                self.__tick(progress)
+                next_tick = stats.moves + self.progress_every
+            if pegs - 1 == npegs: # any jump from here is a solution
+                mask = next(frames[-1], None)
+                if mask is not None:
+                    stats.moves += 1
+                    nodes[len(path)] += 1
+                    path.append(mask)
+                    return self.__moves_of(start, path)
+            for mask in frames[-1]:
+                stats.moves += 1
+                nodes[len(path)] += 1
+                key = canonical(bits ^ mask) # The same key for all rotations / reflections of the board
+                if key in self.boards_seen: # seen a similar board, go to next one
+                    stats.duplicates += 1
+                    continue
+                self.boards_seen.add(key) # Add the new board to previously seen boards
+                if lower_bound(bits ^ mask) > npegs: # it can't get down to npegs, so don't search it
+                    stats.pruned += 1
+                    continue
+                bits ^= mask # make the jump
+                pegs -= 1
+                path.append(mask) # Keep track of where we are
+                frames.append(iter(self.__jumps(bits)))
+                break
+            else: # no more jumps to try from this board, so go back one jump
+                frames.pop()
+                if path:
+                    bits ^= path.pop() # unmake the jump
+                    pegs += 1
+        return None
     
+    # __search_best does one exhaustive DFS (in the same make / unmake style as __search),
+    # working out the fewest pegs that can be left from every board it finishes.
+    # best_seen maps the canonical key of each finished board to that peg count, so a
+    # board that has been seen before (in any orientation) is never searched again.
+    # best holds, for each board on the path, the fewest pegs found below it so far.
+    # floors holds, for each board on the path, the fewest pegs it could possibly get to
+    # (FLOOR, or more if the pruning layer can prove it), so a board stops searching as soon
+    # as it gets there. A jump to a board whose floor is no better than the best so far is skipped.
+    # depth is how many jumps bits is from the start of the solve, for the stats.
+    # Returns the best peg count, and the list of (from, over, to) moves that get there.
+    def __search_best(self, bits: int, progress=None, depth=0):
+        best_seen = self.best_seen
+        stats = self.stats
+        nodes = stats.nodes_per_depth
+        canonical = self.geometry.canonical
+        lower_bound = self.pruning.bound_for(bits, self.geometry)
+        pegs = count_pegs(bits)
+        path = []
+        frames = [iter(self.__jumps(bits))]
+        keys = [canonical(bits)]
+        best = [pegs]
+        floors = [max(FLOOR, lower_bound(bits))]
+        next_tick = stats.moves + self.progress_every
+        while frames:
+            if stats.moves >= next_tick:
+                self.__tick(progress)
+                next_tick = stats.moves + self.progress_every
+            mask = next(frames[-1], None) if best[-1] > floors[-1] else None
+            if mask is not None:
+                stats.moves += 1
+                nodes[depth + len(path)] += 1
+                key = canonical(bits ^ mask) # The same key for all rotations / reflections of the board
+                value = best_seen.get(key)
+                if value is None: # a new board, so make the jump and search below it
+                    floor = max(FLOOR, lower_bound(bits ^ mask))
+                    if floor >= best[-1]: # it can't do any better than what we have
+                        stats.pruned += 1
+                        continue
+                    bits ^= mask
+                    pegs -= 1
+                    path.append(mask)
+                    frames.append(iter(self.__jumps(bits)))
+                    keys.append(key)
+                    best.append(pegs)
+                    floors.append(floor)
+                else: # seen a similar board, so we already know how well it does
+                    stats.duplicates += 1
+                    if value < best[-1]:
+                        best[-1] = value
+                continue
+            # this board is finished, so record how well it does and go back one jump
+            frames.pop()
+            floors.pop()
+            value = best.pop()
+            best_seen.put(keys.pop(), value)
+            if path:
+                bits ^= path.pop()
+                pegs += 1
+                if value < best[-1]:
+                    best[-1] = value
+
+        # Now walk back down from the start, always taking a jump to a board that does as well.
+        # If best_seen is capped, it may have forgotten a board on the way, so search that board again.
+        npegs = value
+        moves = []
+        find_jumps = self.geometry.find_jumps
+        move_of = self.geometry.move_of
+        while pegs > npegs:
+            for mask in find_jumps(bits):
+                child_best = best_seen.get(canonical(bits ^ mask))
+                if child_best is None:
+                    if lower_bound(bits ^ mask) > npegs: # skipped by the pruning layer
+                        continue
+                    child_best, child_moves = self.__search_best(bits ^ mask, progress, depth + len(moves) + 1)
+                    if child_best == npegs:
+                        return npegs, moves + [move_of(bits, mask)] + child_moves
+                elif child_best == npegs:
+                    moves.append(move_of(bits, mask))
+                    bits ^= mask
+                    pegs -= 1
+                    break
+        return npegs, moves
+
+    # __moves_of returns the (from, over, to) moves made by the jump masks in path, starting from bits.
+    # A mask doesn't say which way its jump goes, so each move is worked out from the board before it.
+    def __moves_of(self, bits: int, path) -> list:
+        moves = []
+        for mask in path:
+            moves.append(self.geometry.move_of(bits, mask))
+            bits ^= mask
+        return moves
+
+    # __jumps returns the jump masks from bits, in the order the pruning layer wants them tried
+    def __jumps(self, bits: int) -> list:
+        jumps = self.geometry.find_jumps(bits)
+        if self.pruning.ordering:
+            return self.pruning.order(jumps, bits, self.geometry)
+        return jumps
+
+    def __tick(self, progress):
+        self.stats.sample(self.boards_seen, self.best_seen)
+        if progress and progress(self.stats):
+            raise SolveCancelled(f"Solving cancelled after {self.stats.moves} moves")
+
+    def __finish(self):
+        self.stats.sample(self.boards_seen, self.best_seen)
+        self.stats.finish()
+
     # find_available_locs finds only the available locs for the selected_peg
     # Each available loc will "point to" the jump peg to be removed. 
     # This should enable easy removal and placement of the peg
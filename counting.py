@@ -0,0 +1,135 @@
+import argparse
+import sys
+from geometry import ENGLISH, LAYOUTS, get_geometry
+from bitboard import count_pegs
+from pruning import Pruning, position_class
+
+# Counts how many ways a board can be solved, and how many boards can be reached on the way, e.g.:
+#     python -m counting                                    (the standard start)
+#     python -m counting ooo/ooo/oo.oooo/ooo.ooo/ooooooo/ooo/ooo --first-moves
+#
+# Listing every move sequence would take forever (the standard board has about 10^16 that finish
+# on 1 peg), so they are counted a layer at a time instead. Every jump removes a peg, so all the
+# boards with the same number of pegs are the same number of jumps from the start, and make up one
+# layer. Each layer maps the canonical key of each of its boards (see geometry.py) to the number of
+# move sequences from the start that reach that board in any orientation, and the next layer is
+# worked out from it alone. So only two layers are ever held in memory.
+#
+# This works on canonical keys because a rotated / reflected board has the same jumps (rotated /
+# reflected), to the same children (up to symmetry). So every orientation of a board sends its
+# sequences on to the same canonical children, and the canonical key itself can stand in for them all.
+
+
+# Counts is the result of count_solutions.
+# - layers: (pegs, boards, sequences) for each layer, from the start down. boards is the number of
+#   different boards (up to symmetry) with that many pegs, and sequences the number of move sequences
+#   from the start that reach one of them.
+# - solutions: the number of move sequences that finish with target pegs.
+class Counts():
+    def __init__(self, start: int, target: int):
+        self.start = start
+        self.target = target
+        self.layers = []
+        self.solutions = 0
+
+    def boards(self) -> int:
+        return sum(boards for (pegs, boards, sequences) in self.layers)
+
+    def summary(self) -> str:
+        lines = [f"{pegs:>3} pegs: {boards:>12,} boards {sequences:>30,} sequences"
+                 for (pegs, boards, sequences) in self.layers]
+        lines.append(f"{self.solutions:,} ways to finish with {self.target} peg{'s' if self.target != 1 else ''}")
+        return "\n".join(lines)
+
+    def to_dict(self) -> dict:
+        return {
+            "start": self.start,
+            "target": self.target,
+            "layers": [{"pegs": pegs, "boards": boards, "sequences": sequences}
+                       for (pegs, boards, sequences) in self.layers],
+            "solutions": self.solutions,
+        }
+
+
+# Pruning.bound_for only works out a board's position class once, from the start, since it never
+# changes along a game. But a canonical key is often a rotated / reflected board, which can be in
+# another class, so here there is a lower bound for each class (at most one per symmetry).
+def _lower_bound(pruning, geometry):
+    bounds = {}
+    def lower_bound(bits: int) -> int:
+        board_class = position_class(bits, geometry)
+        if board_class not in bounds:
+            bounds[board_class] = pruning.bound_for(bits, geometry)
+        return bounds[board_class](bits)
+    return lower_bound
+
+
+# count_solutions counts the move sequences from bits that finish with target pegs, and the boards
+# in each layer on the way. If pruning is given (see pruning.py), boards that it shows can't get
+# down to target pegs are dropped as soon as they are reached. That doesn't change the solution
+# count, and can save a lot of work, but the layers then only count the boards that are left.
+def count_solutions(bits: int, target=1, pruning=None, geometry=ENGLISH) -> Counts:
+    canonical = geometry.canonical
+    find_children = geometry.find_children
+    lower_bound = _lower_bound(pruning, geometry) if pruning else None
+    counts = Counts(bits, target)
+    pegs = count_pegs(bits)
+    layer = {canonical(bits): 1}
+    if lower_bound and lower_bound(bits) > target:
+        layer = {}
+    while layer and pegs >= target:
+        counts.layers.append((pegs, len(layer), sum(layer.values())))
+        if pegs == target:
+            counts.solutions = counts.layers[-1][2]
+            break
+        below = {}
+        for board, sequences in layer.items():
+            for child in find_children(board):
+                key = canonical(child)
+                if key in below:
+                    below[key] += sequences
+                elif lower_bound is None or lower_bound(key) <= target:
+                    below[key] = sequences
+        layer = below
+        pegs -= 1
+    return counts
+
+
+# first_moves returns, for each move that can be made from bits, the number of move sequences after
+# it that finish with target pegs. The moves with a count of 0 can't be part of a solution.
+# Moves to the same board (up to symmetry) are only counted once.
+def first_moves(bits: int, target=1, pruning=None, geometry=ENGLISH) -> dict:
+    solutions = {}
+    results = {}
+    for mask in geometry.find_jumps(bits):
+        key = geometry.canonical(bits ^ mask)
+        if key not in solutions:
+            solutions[key] = count_solutions(bits ^ mask, target, pruning, geometry).solutions
+        results[geometry.move_of(bits, mask)] = solutions[key]
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Count the ways to solve a peg solitaire board")
+    parser.add_argument("board", nargs="?", help="board as text, e.g. ooo/ooo/ooooooo/ooo.ooo/ooooooo/ooo/ooo "
+                                                 "(default: the layout's start)")
+    parser.add_argument("--layout", choices=list(LAYOUTS), default="english")
+    parser.add_argument("--target", type=int, default=1, help="number of pegs to finish with")
+    parser.add_argument("--prune", action="store_true",
+                        help="skip boards that can't get down to the target (the layers then only count the rest)")
+    parser.add_argument("--first-moves", action="store_true",
+                        help="also count the solutions after each first move")
+    args = parser.parse_args(argv)
+
+    geometry = get_geometry(args.layout)
+    bits = geometry.start if args.board is None else geometry.text_to_bits(args.board)
+    pruning = Pruning() if args.prune else None
+    print(count_solutions(bits, args.target, pruning, geometry).summary())
+    if args.first_moves:
+        for (f, o, t), solutions in first_moves(bits, args.target, pruning, geometry).items():
+            print(f"{f:>2}-{t:<2} {solutions:,}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,180 @@
+import time
+import numpy as np
+from geometry import ENGLISH
+from bitboard import count_pegs, replay
+from board import SolveCancelled
+from stats import SolveStats
+from worker import MOVES, CANCEL, DUPLICATES
+
+# A breadth-first solver that works on a whole layer of boards at once, as a numpy array of packed
+# boards (see geometry.py), instead of one board at a time. Every jump removes a peg, so the layer
+# of boards with n pegs only ever leads to the layer with n - 1 pegs. Each step:
+# - makes every jump from every board in the layer, one jump at a time: a jump is legal for all
+#   the boards where (boards & mask) == need, and makes the children boards ^ mask
+# - works out the canonical key of every child, with the same per-byte symmetry tables as
+#   Geometry.canonical, but as array lookups
+# - keeps one of each key with np.unique, a chunk of the layer at a time, then merges the chunks
+# The time then goes into numpy, not the interpreter, and there is no seen table: each layer is
+# its own seen set.
+#
+# For every key, the layer also keeps the index of a parent in the layer above. Following them
+# back from the last layer gives a chain of canonical keys, which replay_chain turns into moves.
+# A search with a beam_width only keeps the beam_width boards with the most jumps available in
+# each layer. It takes much less time and memory, but may not find the best result.
+CHUNK_SIZE = 1 << 16 # boards expanded at a time, to keep the arrays of children in check
+BEAM_WIDTH = 10_000 # a beam width that solves the standard board in about a second
+
+
+class Frontier():
+    def __init__(self, geometry=ENGLISH):
+        self.geometry = geometry
+        self.needs = np.array([need for (need, mask) in geometry.jump_masks], dtype=np.uint64)
+        self.masks = np.array([mask for (need, mask) in geometry.jump_masks], dtype=np.uint64)
+        # tables[k, j] is the lookup table of symmetry k for byte j of a board
+        self.tables = np.array(geometry.symmetry_tables, dtype=np.uint64)
+        self.shifts = tuple(np.uint64(8 * j) for j in range(self.tables.shape[1]))
+
+    # expand returns every child of every board, and the index in boards of each child's parent
+    def expand(self, boards):
+        children = []
+        parents = []
+        for need, mask in zip(self.needs, self.masks):
+            legal = np.flatnonzero((boards & mask) == need)
+            children.append(boards[legal] ^ mask)
+            parents.append(legal)
+        return np.concatenate(children), np.concatenate(parents)
+
+    # canonical returns the canonical key of each board (the same as geometry.canonical, per board)
+    def canonical(self, boards):
+        chunks = [((boards >> shift) & np.uint64(0xff)).astype(np.intp) for shift in self.shifts]
+        keys = None
+        for tables in self.tables:
+            image = tables[0][chunks[0]]
+            for table, chunk in zip(tables[1:], chunks[1:]):
+                image |= table[chunk]
+            keys = image if keys is None else np.minimum(keys, image)
+        return keys
+
+    # mobility returns the number of jumps available from each board
+    def mobility(self, boards):
+        count = np.zeros(len(boards), dtype=np.intp)
+        for need, mask in zip(self.needs, self.masks):
+            count += (boards & mask) == need
+        return count
+
+    # next_layer returns the sorted canonical keys of all the children of layer, and for each key,
+    # the index of one of its parents in layer. stats (if given) counts the jumps made.
+    # check (if given) is called between chunks, to report progress, or raise SolveCancelled.
+    def next_layer(self, layer, stats=None, depth=0, check=None):
+        keys = []
+        parents = []
+        made = 0
+        for start in range(0, len(layer), CHUNK_SIZE):
+            children, chunk_parents = self.expand(layer[start:start + CHUNK_SIZE])
+            chunk_keys, first = np.unique(self.canonical(children), return_index=True)
+            keys.append(chunk_keys)
+            parents.append(chunk_parents[first] + start)
+            made += len(children)
+            if stats is not None:
+                stats.moves += len(children)
+                stats.nodes_per_depth[depth] += len(children)
+            if check:
+                check()
+        if not keys:
+            return np.empty(0, dtype=np.uint64), np.empty(0, dtype=np.intp)
+        keys, first = np.unique(np.concatenate(keys), return_index=True)
+        parents = np.concatenate(parents)[first]
+        if stats is not None:
+            stats.duplicates += made - len(keys) # every child after the first with the same key
+        return keys, parents
+
+    # beam keeps the width boards of keys with the most jumps available, still sorted by key
+    def beam(self, keys, parents, width):
+        if len(keys) <= width:
+            return keys, parents
+        keep = np.sort(np.argsort(-self.mobility(keys), kind="stable")[:width])
+        return keys[keep], parents[keep]
+
+    # replay_chain turns a chain of canonical keys (one per layer, from the start's) into the
+    # (from, over, to) moves from bits, by always taking the jump to the next key in the chain
+    def replay_chain(self, bits: int, chain) -> list:
+        geometry = self.geometry
+        moves = []
+        for key in chain[1:]:
+            for mask in geometry.find_jumps(bits):
+                if geometry.canonical(bits ^ mask) == key:
+                    moves.append(geometry.move_of(bits, mask))
+                    bits ^= mask
+                    break
+        return moves
+
+
+# layers yields (pegs, sorted canonical keys) for every layer of boards reachable from bits,
+# holding only one layer at a time
+def layers(bits: int, geometry=ENGLISH):
+    frontier = Frontier(geometry)
+    pegs = count_pegs(bits)
+    layer = np.array([geometry.canonical(bits)], dtype=np.uint64)
+    while len(layer):
+        yield pegs, layer
+        layer, _ = frontier.next_layer(layer)
+        pegs -= 1
+
+
+# search finds the fewest pegs that can be left from bits (as far as the beam allows), and the
+# (from, over, to) moves to get there. Returns (npegs, moves, SolveStats).
+# progress is called as in Board.solve, with the stats, after every chunk of boards, and if it
+# returns True the search is abandoned, and SolveCancelled is raised.
+def search(bits: int, geometry=ENGLISH, beam_width=None, progress=None):
+    frontier = Frontier(geometry)
+    stats = SolveStats(geometry.n_holes)
+
+    def check():
+        if progress and progress(stats):
+            raise SolveCancelled(f"Solving cancelled after {stats.moves} moves")
+
+    layer = np.array([geometry.canonical(bits)], dtype=np.uint64)
+    chain_layers = [(layer, None)]
+    while True:
+        keys, parents = frontier.next_layer(chain_layers[-1][0], stats, len(chain_layers) - 1, check)
+        if not len(keys):
+            break
+        if beam_width:
+            keys, parents = frontier.beam(keys, parents, beam_width)
+        chain_layers.append((keys, parents))
+        # Every layer is kept, for the way back, so together they are the search's seen table
+        stats.seen_sizes.append((stats.moves, sum(len(layer) for (layer, _) in chain_layers)))
+        stats.peak_seen_bytes = max(stats.peak_seen_bytes, sum(
+            layer.nbytes + (layer_parents.nbytes if layer_parents is not None else 0)
+            for (layer, layer_parents) in chain_layers))
+
+    # Follow the parents back up from a board in the last layer
+    index = 0
+    chain = []
+    for keys, parents in reversed(chain_layers):
+        chain.append(int(keys[index]))
+        if parents is not None:
+            index = int(parents[index])
+    chain.reverse()
+    npegs = count_pegs(bits) - (len(chain_layers) - 1)
+    stats.iteration_times.append((npegs, time.perf_counter() - stats.started))
+    stats.finish()
+    return npegs, frontier.replay_chain(bits, chain), stats
+
+
+# numpy_solve solves the grid with search, in the same shape as the other engines (see worker.py)
+def numpy_solve(grid, status, beam_width=None, geometry=None):
+    geometry = ENGLISH if geometry is None else geometry
+    def progress(stats):
+        status[MOVES] = stats.moves
+        return status[CANCEL] != 0
+    start = geometry.grid_to_bits(grid)
+    try:
+        npegs, moves, stats = search(start, geometry, beam_width, progress)
+    except SolveCancelled:
+        return [], None
+    status[MOVES] = stats.moves
+    status[DUPLICATES] = stats.duplicates
+    if not moves:
+        return [], stats
+    return [geometry.bits_to_grid(bits) for bits in replay(start, moves)], stats
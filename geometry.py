@@ -0,0 +1,270 @@
+import functools
+import itertools
+import numpy as np
+from constants import DTYPE, SOLITAIRE
+
+# A Geometry is a board layout, worked out once into the tables the solvers run over:
+# the holes, every jump as (from, over, to) holes and as bit masks, and the board's symmetries
+# as lookup tables for canonical keys (see bitboard.py for how boards are packed into ints).
+#
+# A layout is a list of rows, with o for a hole that starts with a peg in it, . for a hole that
+# starts empty, and a space where there is no hole. Square boards have jumps along the rows and
+# columns. Triangular boards are written with row r holding holes 0..r, so that pegs can also
+# jump along the diagonal (down and to the right, or up and to the left).
+SQUARE = "square"
+TRIANGULAR = "triangular"
+
+# Jump directions, in the order the solver tries them. For the English board this is the order
+# that Board.find_moves used to scan the grid (up, right, down, left), so it searches the same way.
+DIRECTIONS = {
+    SQUARE: ((-1, 0), (0, 1), (1, 0), (0, -1)),
+    TRIANGULAR: ((-1, -1), (-1, 0), (0, 1), (1, 1), (1, 0), (0, -1)),
+}
+
+
+def _grid_layout(grid) -> list:
+    return ["".join({8: " ", 1: "o", 0: "."}[int(cell)] for cell in row) for row in grid]
+
+LAYOUTS = {
+    # The standard 33 hole cross (constants.SOLITAIRE)
+    "english": (_grid_layout(SOLITAIRE), SQUARE),
+    # The 37 hole French board. With the centre empty it can't get down to 1 peg, so this is
+    # the usual start instead.
+    "european": ([
+        "  .oo  ",
+        " ooooo ",
+        "ooooooo",
+        "ooooooo",
+        "ooooooo",
+        " ooooo ",
+        "  ooo  ",
+    ], SQUARE),
+    # The 45 hole German board (Wiegleb's), a cross on a 9x9 grid
+    "german": ([
+        "   ooo   ",
+        "   ooo   ",
+        "   ooo   ",
+        "ooooooooo",
+        "oooo.oooo",
+        "ooooooooo",
+        "   ooo   ",
+        "   ooo   ",
+        "   ooo   ",
+    ], SQUARE),
+    # The 41 hole diamond, on a 9x9 grid
+    "diamond": ([
+        "    o    ",
+        "   ooo   ",
+        "  ooooo  ",
+        " ooooooo ",
+        "oooo.oooo",
+        " ooooooo ",
+        "  ooooo  ",
+        "   ooo   ",
+        "    o    ",
+    ], SQUARE),
+    # The 15 hole triangle
+    "triangular": ([
+        ".",
+        "oo",
+        "ooo",
+        "oooo",
+        "ooooo",
+    ], TRIANGULAR),
+}
+
+
+class Geometry():
+    def __init__(self, name, layout, lattice=SQUARE):
+        self.name = name
+        self.lattice = lattice
+        self.layout = tuple(layout)
+        self.shape = (len(layout), max(len(row) for row in layout))
+        # holes maps hole index -> (row, col), and hole_index maps (row, col) -> hole index.
+        # Holes are numbered row by row, from the top left.
+        self.holes = tuple((r, c) for r, row in enumerate(layout) for c, cell in enumerate(row) if cell in "o.")
+        self.hole_index = {loc: i for i, loc in enumerate(self.holes)}
+        self.n_holes = len(self.holes)
+        self.full = (1 << self.n_holes) - 1
+        self.start = sum(1 << i for i, (r, c) in enumerate(self.holes) if layout[r][c] == "o")
+        # A grid with 1 in every hole, and 8 where there is no hole (like constants.EMPTY_BOARD)
+        self.empty_grid = np.full(self.shape, 8, DTYPE)
+        for (r, c) in self.holes:
+            self.empty_grid[r, c] = 1
+        self._row_starts = [i for i, (r, c) in enumerate(self.holes) if i == 0 or self.holes[i - 1][0] != r]
+
+        # Every possible jump as (from, over, to) hole indices, listed hole by hole.
+        # For move generation we only need masks. A jump is legal if the from and over holes
+        # have pegs and the to hole is empty, i.e. (bits & mask) == need.
+        # Making (or unmaking) the jump is then just bits ^ mask.
+        self.jumps = tuple(
+            (i, self.hole_index[(r + dr, c + dc)], self.hole_index[(r + 2*dr, c + 2*dc)])
+            for i, (r, c) in enumerate(self.holes)
+            for (dr, dc) in DIRECTIONS[lattice]
+            if (r + dr, c + dc) in self.hole_index and (r + 2*dr, c + 2*dc) in self.hole_index
+        )
+        self.jump_masks = tuple(((1 << f) | (1 << o), (1 << f) | (1 << o) | (1 << t)) for (f, o, t) in self.jumps)
+        self.move_of_mask = {mask: move for (need, mask), move in zip(self.jump_masks, self.jumps)}
+        (self.find_jumps, self.find_children) = _make_move_generators(self.jump_masks)
+
+        self.symmetries = self.__find_symmetries()
+        # Permuting the bits one at a time is slow in Python, so each permutation is split into
+        # byte-sized chunks, with a 256 entry lookup table per chunk.
+        self.symmetry_tables = tuple(self.__chunk_tables(perm) for perm in self.symmetries)
+        self.canonical = _make_canonical(self.symmetry_tables, self.n_holes)
+
+    def __repr__(self):
+        return f"Geometry({self.name!r}, {self.n_holes} holes)"
+
+    # __find_symmetries returns the rotations / reflections that map the board onto itself, each as
+    # a permutation of the holes: symmetries[k][i] is where hole i ends up under symmetry k.
+    # The identity is always first.
+    def __find_symmetries(self):
+        if self.lattice == SQUARE:
+            size = max(self.shape) - 1
+            transforms = (
+                lambda r, c: (r, c),
+                lambda r, c: (size - c, r),         # np.rot90(grid, 1)
+                lambda r, c: (size - r, size - c),  # np.rot90(grid, 2)
+                lambda r, c: (c, size - r),         # np.rot90(grid, 3)
+                lambda r, c: (c, r),                # np.transpose(grid)
+                lambda r, c: (size - r, c),         # np.rot90(np.transpose(grid), 1)
+                lambda r, c: (size - c, size - r),  # np.rot90(np.transpose(grid), 2)
+                lambda r, c: (r, size - c),         # np.rot90(np.transpose(grid), 3)
+            )
+        else:
+            # A hole on a triangle is (distance from the left edge, from the right edge, from the bottom),
+            # and the symmetries of the triangle are the permutations of those 3 distances.
+            size = self.shape[0] - 1
+            transforms = tuple(
+                lambda r, c, p=p: (size - (r - c, c, size - r)[p[2]], (r - c, c, size - r)[p[1]])
+                for p in itertools.permutations(range(3))
+            )
+        symmetries = []
+        for transform in transforms:
+            images = [transform(r, c) for (r, c) in self.holes]
+            if all(image in self.hole_index for image in images):
+                symmetries.append(tuple(self.hole_index[image] for image in images))
+        return tuple(symmetries)
+
+    def __chunk_tables(self, perm):
+        tables = []
+        for start in range(0, self.n_holes, 8):
+            table = []
+            for byte in range(256):
+                image = 0
+                for j in range(8):
+                    if (byte >> j) & 1 and start + j < self.n_holes:
+                        image |= 1 << perm[start + j]
+                table.append(image)
+            tables.append(tuple(table))
+        return tuple(tables)
+
+    def grid_to_bits(self, grid) -> int:
+        bits = 0
+        for i, (r, c) in enumerate(self.holes):
+            if grid[r][c] == 1:
+                bits |= 1 << i
+        return bits
+
+    def bits_to_grid(self, bits: int):
+        grid = self.empty_grid.copy()
+        for i, (r, c) in enumerate(self.holes):
+            grid[r, c] = (bits >> i) & 1
+        return grid
+
+    # A jump and its reverse share a mask, so move_of_mask can give a move backwards. That doesn't
+    # matter to replay (which just xors the holes), but move_of gives the move the right way round:
+    # the (from, over, to) move that mask makes on bits.
+    def move_of(self, bits: int, mask: int) -> tuple:
+        (f, o, t) = self.move_of_mask[mask]
+        return (f, o, t) if (bits >> f) & 1 else (t, o, f)
+
+    # moves_between returns the (from, over, to) moves between a list of boards, each one jump from the last
+    def moves_between(self, boards) -> list:
+        return [self.move_of(before, before ^ after) for before, after in zip(boards, boards[1:])]
+
+    def transform(self, bits: int, k: int) -> int:
+        image = 0
+        for table in self.symmetry_tables[k]:
+            image |= table[bits & 0xff]
+            bits >>= 8
+        return image
+
+    # A board as text: the holes of each row (o for a peg, . for empty), with the rows joined by /.
+    # The English start is "ooo/ooo/ooooooo/ooo.ooo/ooooooo/ooo/ooo".
+    def bits_to_text(self, bits: int) -> str:
+        holes = "".join("o" if (bits >> i) & 1 else "." for i in range(self.n_holes))
+        ends = self._row_starts[1:] + [self.n_holes]
+        return "/".join(holes[start:end] for start, end in zip(self._row_starts, ends))
+
+    def text_to_bits(self, text: str) -> int:
+        holes = text.strip().replace("/", "")
+        if len(holes) != self.n_holes or set(holes) - set("o."):
+            raise ValueError(f"Not a board: {text.strip()!r}. Expected {self.n_holes} holes, as o (peg) or . (empty)")
+        return sum(1 << i for i, hole in enumerate(holes) if hole == "o")
+
+
+# find_jumps returns the masks of all legal jumps, so the caller can make (and unmake)
+# each one with bits ^ mask. move_of_mask turns a mask back into its (from, over, to) move.
+# find_children returns all the boards reachable in 1 move, as packed ints.
+# Both are made per geometry as plain functions, since the solver calls them for every board.
+def _make_move_generators(jump_masks):
+    def find_jumps(bits: int) -> list:
+        return [mask for (need, mask) in jump_masks if bits & mask == need]
+
+    def find_children(bits: int) -> list:
+        return [bits ^ mask for (need, mask) in jump_masks if bits & mask == need]
+    return find_jumps, find_children
+
+
+# canonical maps a board to the smallest of its symmetric images. Two boards are the same
+# up to rotation / reflection exactly when their canonical keys are equal, so a seen-set
+# of canonical keys needs a single probe per board.
+# To keep it fast, the lookup tables of all the symmetries for each chunk are merged into one
+# table, with image k stored in bits [k*lane, (k+1)*lane). A single set of lookups (one per chunk)
+# then gives all the images at once. canonical is called for every move the solver makes,
+# so the usual case (up to 40 holes, in 5 chunks, with 8 symmetries) gets its own unrolled version.
+def _make_canonical(symmetry_tables, n_holes):
+    lane = max(n_holes, 1)
+    lane_mask = (1 << lane) - 1
+    shifts = tuple(range(0, lane * len(symmetry_tables), lane))
+    merged = tuple(
+        tuple(
+            sum(tables[j][byte] << shift for shift, tables in zip(shifts, symmetry_tables))
+            for byte in range(256)
+        )
+        for j in range(len(symmetry_tables[0]))
+    )
+
+    if len(merged) == 5 and len(shifts) == 8:
+        c0, c1, c2, c3, c4 = merged
+        _, s1, s2, s3, s4, s5, s6, s7 = shifts
+
+        def canonical(bits: int) -> int:
+            x = (c0[bits & 0xff] | c1[(bits >> 8) & 0xff] | c2[(bits >> 16) & 0xff]
+                 | c3[(bits >> 24) & 0xff] | c4[bits >> 32])
+            return min(
+                x & lane_mask, (x >> s1) & lane_mask, (x >> s2) & lane_mask, (x >> s3) & lane_mask,
+                (x >> s4) & lane_mask, (x >> s5) & lane_mask, (x >> s6) & lane_mask, x >> s7
+            )
+        return canonical
+
+    def canonical(bits: int) -> int:
+        x = 0
+        for table in merged:
+            x |= table[bits & 0xff]
+            bits >>= 8
+        return min([(x >> shift) & lane_mask for shift in shifts])
+    return canonical
+
+
+@functools.lru_cache(maxsize=None)
+def get_geometry(name: str) -> Geometry:
+    if name not in LAYOUTS:
+        raise ValueError(f"Unknown layout {name!r}, expected one of {tuple(LAYOUTS)}")
+    (layout, lattice) = LAYOUTS[name]
+    return Geometry(name, layout, lattice)
+
+
+ENGLISH = get_geometry("english")
@@ -0,0 +1,97 @@
+from array import array
+from bitboard import JUMPS, bits_to_text, text_to_bits
+
+# GameHistory is the record of a game: the start board, and every (from, over, to) move made
+# from it, 3 bytes per move. position is how many of the moves are currently made, so undo
+# and redo just move it back and forth, making or unmaking one move on the packed board.
+# Making a new move after undoing throws away the moves that were undone.
+#
+# A history is saved as a small text file: the start board (as text, see bitboard.py),
+# the moves as from-to hole numbers (the hole jumped over is always between them), and the position:
+#     ooo/ooo/ooooooo/ooo.ooo/ooooooo/ooo/ooo
+#     4-16 23-9 ...
+#     2
+_JUMP_OF = {(f, t): (f, o, t) for (f, o, t) in JUMPS}
+
+
+def _mask(holes) -> int:
+    return sum(1 << i for i in holes)
+
+
+class GameHistory():
+    def __init__(self, start: int):
+        self.start = start
+        self.bits = start # the board after the first position moves
+        self.moves = array("B")
+        self.position = 0
+
+    def __len__(self):
+        return len(self.moves) // 3
+
+    def __move(self, i: int) -> tuple:
+        return tuple(self.moves[3*i:3*i + 3])
+
+    def __flip(self, move):
+        self.bits ^= _mask(move)
+
+    # push makes a new move, throwing away any moves that were undone
+    def push(self, move):
+        del self.moves[3 * self.position:]
+        self.moves.extend(move)
+        self.position += 1
+        self.__flip(move)
+
+    def extend(self, moves):
+        for move in moves:
+            self.push(move)
+
+    def can_undo(self) -> bool:
+        return self.position > 0
+
+    def can_redo(self) -> bool:
+        return self.position < len(self)
+
+    # undo takes back the last move made, and returns it (or None if there is nothing to undo)
+    def undo(self):
+        if not self.can_undo():
+            return None
+        self.position -= 1
+        move = self.__move(self.position)
+        self.__flip(move)
+        return move
+
+    # redo makes the next move that was undone, and returns it (or None if there is nothing to redo)
+    def redo(self):
+        if not self.can_redo():
+            return None
+        move = self.__move(self.position)
+        self.position += 1
+        self.__flip(move)
+        return move
+
+    def save(self, path):
+        with open(path, "w") as f:
+            f.write(bits_to_text(self.start) + "\n")
+            f.write(" ".join(f"{self.moves[i]}-{self.moves[i + 2]}" for i in range(0, len(self.moves), 3)) + "\n")
+            f.write(f"{self.position}\n")
+
+    # load reads a history saved with save, checking that every move in it can be made
+    @classmethod
+    def load(cls, path):
+        with open(path) as f:
+            lines = f.read().splitlines()
+        if len(lines) != 3:
+            raise ValueError(f"{path} is not a saved game")
+        history = cls(text_to_bits(lines[0]))
+        for jump in lines[1].split():
+            (f, _, t) = jump.partition("-")
+            move = _JUMP_OF.get((int(f), int(t)))
+            if move is None or history.bits & _mask(move) != _mask(move[:2]): # from and over need pegs, to must be empty
+                raise ValueError(f"{path}: {jump} is not a legal move, after {len(history)} moves")
+            history.push(move)
+        position = int(lines[2])
+        if not 0 <= position <= len(history):
+            raise ValueError(f"{path}: position {position} is out of range")
+        while history.position > position:
+            history.undo()
+        return history
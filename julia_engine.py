@@ -0,0 +1,108 @@
+import os
+import sys
+import threading
+import numpy as np
+from constants import DTYPE
+from bitboard import grid_to_bits, bits_to_grid, replay
+from stats import SolveStats
+from worker import CANCEL
+
+# The Julia solver is started lazily, in a background thread, so the window doesn't wait for it.
+# Until it is ready (or if juliacall isn't installed), the window solves with Python instead.
+#
+# To cut the start up time further, build a precompiled system image with
+#     julia SolSolver/build_sysimage.jl
+# and point SOLSOLVER_SYSIMAGE at it (SolSolver/SolSolver.so is used if it exists).
+SOLSOLVER_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "SolSolver")
+SYSIMAGE_PATH = os.environ.get("SOLSOLVER_SYSIMAGE", os.path.join(SOLSOLVER_PATH, "SolSolver.so"))
+
+# A board with a single move, solved once to get Julia to compile the solver before it's needed
+WARM_UP_BOARD = np.array([
+    [8, 8, 0, 0, 0, 8, 8],
+    [8, 8, 0, 0, 0, 8, 8],
+    [0, 0, 0, 0, 0, 0, 0],
+    [0, 0, 0, 1, 1, 0, 0],
+    [0, 0, 0, 0, 0, 0, 0],
+    [8, 8, 0, 0, 0, 8, 8],
+    [8, 8, 0, 0, 0, 8, 8]
+], DTYPE)
+
+_ready = threading.Event()
+_loader = None
+_solve_unlocked = None
+error = None # Set to the exception if Julia couldn't be started
+
+
+def _load():
+    global _solve_unlocked, error
+    try:
+        if os.path.exists(SYSIMAGE_PATH):
+            os.environ.setdefault("PYTHON_JULIACALL_SYSIMAGE", SYSIMAGE_PATH)
+        from juliacall import Main as jl
+        from juliacall import Pkg as jlPkg
+        jlPkg.activate(SOLSOLVER_PATH)
+        jl.seval("using SolSolver")
+        # Julia doesn't release Python's GIL by itself, which would stop the Tk main loop (running in the
+        # main thread) from doing anything while Julia solves in the background. So release it for the solve.
+        # (PythonCall is looked up by its UUID, since it isn't a dependency of the SolSolver project.)
+        solve_unlocked = jl.seval("""
+            let PythonCall = Base.require(Base.PkgId(Base.UUID("6099a3de-0909-46bc-b1f4-468b9a2dfc0d"), "PythonCall"))
+                (bits, status) -> PythonCall.GIL.unlock(() -> SolSolver.solve_packed(bits, status))
+            end
+        """)
+        _solve_unlocked = solve_unlocked
+        solve(WARM_UP_BOARD, np.zeros(2, dtype=np.int64))
+        _ready.set()
+    except Exception as e: # Most likely juliacall isn't installed. Python will do the solving.
+        error = e
+        print(f"Julia solver unavailable, using the Python solver instead: {e}", file=sys.stderr)
+
+
+# start begins loading Julia in the background. It is safe to call more than once.
+def start():
+    global _loader
+    if _loader is None:
+        _loader = threading.Thread(target=_load, daemon=True)
+        _loader.start()
+
+
+# ready is True once Julia has been loaded and warmed up
+def ready() -> bool:
+    return _ready.is_set()
+
+
+# wait blocks until loading (begun with start) has finished, or timeout seconds have passed,
+# and returns ready(). If it failed, error says why.
+def wait(timeout=None) -> bool:
+    if _loader is not None:
+        _loader.join(timeout)
+    return ready()
+
+
+# solve solves the grid with the Julia solver. The status array is shared with Julia,
+# which keeps the number of moves in it up to date, and stops if it is asked to cancel.
+# The board goes to Julia packed into a single integer (see bitboard.py), and the solution comes
+# back as a matrix of (from, over, to) moves, read in place by numpy. The grids are rebuilt here.
+# Returns the list of grids, and the SolveStats (None if cancelled), like python_solve.
+def solve(grid, status):
+    start = grid_to_bits(grid)
+    moves, julia_stats = _solve_unlocked(start, status)
+    moves = moves.to_numpy(copy=False)
+    stats = None if status[CANCEL] else _to_stats(julia_stats)
+    if len(moves) == 0:
+        return [], stats
+    return [bits_to_grid(bits) for bits in replay(start, moves.tolist())], stats
+
+
+# _to_stats copies the Julia solver's SolveStats into a Python one
+def _to_stats(julia_stats) -> SolveStats:
+    stats = SolveStats()
+    stats.moves = julia_stats.moves
+    stats.duplicates = julia_stats.duplicates
+    stats.nodes_per_depth = list(julia_stats.nodes_per_depth)
+    stats.seen_sizes = [tuple(sample) for sample in julia_stats.seen_sizes]
+    stats.iteration_times = [tuple(iteration) for iteration in julia_stats.iteration_times]
+    stats.elapsed = julia_stats.elapsed
+    stats.peak_seen_bytes = julia_stats.peak_seen_bytes
+    stats.peak_rss_mb = julia_stats.peak_rss_mb
+    return stats
@@ -0,0 +1,93 @@
+import multiprocessing as mp
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from board import Board, SolveCancelled, FLOOR
+from stats import SolveStats
+from bitboard import grid_to_bits, bits_to_grid, count_pegs, find_jumps, canonical, replay, move_of
+
+# The parallel solver expands the first few moves itself, and hands the boards it reaches
+# to a pool of worker processes, each of which solves its boards with Board.find_solution.
+# As soon as any worker gets down to FLOOR pegs, the others are told to stop.
+DEFAULT_DEPTH = 3
+
+# Each worker process keeps one Board for all the subtrees it is given. Its best_seen
+# carries over from one subtree to the next, so boards shared between subtrees (in any
+# orientation) are only searched once per worker.
+_board = None
+_stop = None
+
+
+def _init_worker(stop):
+    global _board, _stop
+    _board = Board(None)
+    _stop = stop
+
+
+# _solve_subtree returns the best peg count and moves from bits, and the stats of just this subtree
+def _solve_subtree(bits: int):
+    _board.stats = SolveStats(len(_board.stats.nodes_per_depth))
+    try:
+        npegs, moves = _board.find_solution(bits, progress=lambda _stats: _stop.is_set())
+    except SolveCancelled:
+        return None
+    return npegs, moves, _board.stats
+
+
+# _expand makes every sequence of depth moves from bits, keeping only one board per canonical key.
+# Returns the boards reached (with the moves to reach them), and any boards where the moves
+# ran out early.
+def _expand(bits: int, depth: int):
+    frontier = {canonical(bits): (bits, [])}
+    dead_ends = []
+    for _ in range(depth):
+        next_frontier = {}
+        for (board, moves) in frontier.values():
+            jumps = find_jumps(board)
+            if not jumps:
+                dead_ends.append((board, moves))
+            for mask in jumps:
+                child = board ^ mask
+                key = canonical(child)
+                if key not in next_frontier:
+                    next_frontier[key] = (child, moves + [move_of(board, mask)])
+        frontier = next_frontier
+    return list(frontier.values()), dead_ends
+
+
+# solve_parallel returns the same list of grids (and stats) as Board.solve, using up to workers processes
+# (all the cores by default). depth is how many moves are made before splitting the search.
+# The stats add up the work of all the workers, not counting the first depth moves.
+def solve_parallel(grid, workers=None, depth=DEFAULT_DEPTH):
+    stats = SolveStats()
+    start = grid_to_bits(grid)
+    frontier, dead_ends = _expand(start, depth)
+    best_pegs, best_moves = count_pegs(start), []
+    for (board, moves) in dead_ends:
+        if count_pegs(board) < best_pegs:
+            best_pegs, best_moves = count_pegs(board), moves
+
+    if frontier and best_pegs > FLOOR:
+        context = mp.get_context()
+        stop = context.Event()
+        with ProcessPoolExecutor(max_workers=workers, mp_context=context,
+                                 initializer=_init_worker, initargs=(stop,)) as pool:
+            futures = {pool.submit(_solve_subtree, board): moves for (board, moves) in frontier}
+            for future in as_completed(futures):
+                result = future.result() if not future.cancelled() else None
+                if result is None:
+                    continue
+                npegs, moves, subtree_stats = result
+                stats.merge(subtree_stats, depth)
+                if npegs < best_pegs:
+                    best_pegs, best_moves = npegs, futures[future] + moves
+                if best_pegs == FLOOR: # nothing can do better, so stop the other workers
+                    stop.set()
+                    for other in futures:
+                        other.cancel()
+                    break
+
+    stats.iteration_times.append((best_pegs, time.perf_counter() - stats.started))
+    stats.finish()
+    if best_moves:
+        return [bits_to_grid(bits) for bits in replay(start, best_moves)], stats
+    return [], stats
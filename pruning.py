@@ -0,0 +1,196 @@
+import functools
+import random
+from geometry import ENGLISH, SQUARE
+from bitboard import count_pegs
+
+# The pruning layer gives the solver a lower bound on the number of pegs that will be left
+# on a board however it is played, so it can skip boards that can't do well enough, and an
+# order to try the jumps in. Each part can be switched on and off, to measure what it saves:
+#
+# - position_class: the "rule of three". Number the diagonals of the board 0, 1, 2, 0, 1, 2, ...
+#   Every jump takes one peg off each of two diagonals, and adds one to the third, so the parity
+#   of (pegs on diagonals 0 and 1) and (pegs on diagonals 1 and 2) never changes, in either
+#   direction of diagonal. A board can only end with 1 peg in a hole with the same parities.
+#   If there is no such hole, it can't get down to 1 peg.
+# - pagoda: a pagoda function gives each hole a weight, such that no jump increases the total
+#   weight of the pegs. If the board weighs less than every hole it could finish on (given its
+#   position class), it can't get down to 1 peg.
+# - isolation: a peg only ever jumps to holes of its own (row parity, col parity) class, and can
+#   only be jumped over by pegs from the two classes next to it. If both of those classes are
+#   empty, every peg in the class is stuck there for good.
+# - ordering: None to keep the solver's usual order, "centre" to try jumps that land nearest the
+#   centre first, or "mobility" to try the jumps that leave the fewest moves first.
+#
+# Every table is worked out per board geometry (see geometry.py). The position class and
+# isolation rules rely on jumps only going along rows and columns, so on other boards
+# (e.g. the triangle) they never prune anything.
+ORDERINGS = (None, "centre", "mobility")
+
+
+def _mask(holes) -> int:
+    return sum(1 << i for i in holes)
+
+
+# For the position class: masks of the holes on each diagonal, for both directions of diagonal
+@functools.lru_cache(maxsize=None)
+def _diagonals(geometry) -> tuple:
+    if geometry.lattice != SQUARE:
+        return ()
+    return tuple(
+        tuple(_mask(i for i, (r, c) in enumerate(geometry.holes) if diagonal(r, c) % 3 == k) for k in range(3))
+        for diagonal in (lambda r, c: r + c, lambda r, c: r - c)
+    )
+
+
+def position_class(bits: int, geometry=ENGLISH) -> tuple:
+    parities = []
+    for (d0, d1, d2) in _diagonals(geometry):
+        parities.append(count_pegs(bits & (d0 | d1)) & 1)
+        parities.append(count_pegs(bits & (d1 | d2)) & 1)
+    return tuple(parities)
+
+
+# final_holes maps each position class to the mask of the holes a board of that class can finish on
+@functools.lru_cache(maxsize=None)
+def final_holes(geometry=ENGLISH) -> dict:
+    holes = {}
+    for i in range(geometry.n_holes):
+        board_class = position_class(1 << i, geometry)
+        holes[board_class] = holes.get(board_class, 0) | (1 << i)
+    return holes
+
+
+# Pagoda functions, as a weight per hole, such that for every jump (from, over, to)
+# weight[from] + weight[over] >= weight[to].
+def is_pagoda(weights, geometry=ENGLISH) -> bool:
+    return all(weights[f] + weights[o] >= weights[t] for (f, o, t) in geometry.jumps)
+
+
+# Weighing a board a hole at a time is slow, so (as for the symmetries in geometry.py)
+# each pagoda is split into byte-sized chunks with a lookup table per chunk.
+def _chunk_weights(weights):
+    n_holes = len(weights)
+    return tuple(
+        tuple(sum(weights[start + j] for j in range(8) if (byte >> j) & 1 and start + j < n_holes)
+              for byte in range(256))
+        for start in range(0, n_holes, 8)
+    )
+
+
+def weigh(bits: int, tables) -> int:
+    total = 0
+    for table in tables:
+        total += table[bits & 0xff]
+        bits >>= 8
+    return total
+
+
+# _find_pagodas finds pagoda functions that give weight to every hole in the holes mask,
+# so that a board weighing 0 can't finish on any of them. Each one starts with weight 1 on
+# those holes, and adds weight to the from or over hole of any jump that breaks the rule,
+# until none do. Trying the jumps in different (but fixed) orders gives different pagodas,
+# and the lightest few are kept, since they prove the most boards stuck.
+PAGODA_TRIES = 50
+PAGODAS_PER_CLASS = 4
+
+def _find_pagodas(holes: int, geometry=ENGLISH) -> list:
+    jumps = geometry.jumps
+    found = set()
+    for seed in range(PAGODA_TRIES):
+        rng = random.Random(seed)
+        weights = [(holes >> i) & 1 for i in range(geometry.n_holes)]
+        changed = True
+        while changed:
+            changed = False
+            for (f, o, t) in rng.sample(jumps, len(jumps)):
+                if weights[f] + weights[o] < weights[t]:
+                    weights[rng.choice((f, o))] += 1
+                    changed = True
+        found.add(tuple(weights))
+    pagodas = sorted(found, key=lambda weights: (sum(weights), weights))[:PAGODAS_PER_CLASS]
+    assert all(is_pagoda(weights, geometry) for weights in pagodas)
+    return pagodas
+
+
+# _pagoda_tables returns the (lookup tables, lightest finishing hole) of each pagoda for a position class
+@functools.lru_cache(maxsize=None)
+def _pagoda_tables(board_class, geometry=ENGLISH) -> tuple:
+    holes = final_holes(geometry)[board_class]
+    return tuple(
+        (_chunk_weights(weights), min(weights[i] for i in range(geometry.n_holes) if (holes >> i) & 1))
+        for weights in _find_pagodas(holes, geometry)
+    )
+
+
+# The 4 (row parity, col parity) classes of holes, and for each, the classes that can jump over it.
+# _stuck_classes returns the (class, classes that can jump over it) masks.
+@functools.lru_cache(maxsize=None)
+def _stuck_classes(geometry) -> tuple:
+    if geometry.lattice != SQUARE:
+        return ()
+    parity_classes = tuple(
+        _mask(i for i, (r, c) in enumerate(geometry.holes) if (r % 2, c % 2) == (a, b))
+        for (a, b) in ((0, 0), (0, 1), (1, 0), (1, 1))
+    )
+    return tuple((parity_classes[k], parity_classes[k ^ 1] | parity_classes[k ^ 2]) for k in range(4))
+
+
+# How far each jump lands from the centre, for the "centre" ordering
+@functools.lru_cache(maxsize=None)
+def _centre_distance(geometry) -> dict:
+    holes = geometry.holes
+    centre = tuple(sum(coords) / len(holes) for coords in zip(*holes))
+    return {
+        mask: abs(holes[t][0] - centre[0]) + abs(holes[t][1] - centre[1])
+        for (need, mask), (f, o, t) in zip(geometry.jump_masks, geometry.jumps)
+    }
+
+
+class Pruning():
+    def __init__(self, position_class=True, pagoda=True, isolation=True, ordering=None):
+        if ordering not in ORDERINGS:
+            raise ValueError(f"Unknown ordering {ordering!r}, expected one of {ORDERINGS}")
+        self.position_class = position_class
+        self.pagoda = pagoda
+        self.isolation = isolation
+        self.ordering = ordering
+
+    # bound_for returns a lower_bound(bits) function, giving a number of pegs that bits can never
+    # get below. It is only valid for bits reachable from start, which lets the position class
+    # (which never changes) be worked out once, rather than for every board.
+    def bound_for(self, start: int, geometry=ENGLISH):
+        floor = 1
+        targets = ()
+        board_class = position_class(start, geometry)
+        if board_class not in final_holes(geometry):
+            if self.position_class:
+                floor = 2
+        elif self.pagoda:
+            targets = _pagoda_tables(board_class, geometry)
+        isolation = self.isolation
+        stuck_classes = _stuck_classes(geometry)
+
+        def lower_bound(bits: int) -> int:
+            bound = floor
+            if isolation:
+                stuck = 0
+                for pegs, neighbours in stuck_classes:
+                    if bits & pegs and not bits & neighbours:
+                        stuck += count_pegs(bits & pegs)
+                if stuck > bound:
+                    return stuck
+            if bound == 1:
+                for tables, target in targets:
+                    if weigh(bits, tables) < target:
+                        return 2
+            return bound
+        return lower_bound
+
+    # order returns the jump masks from bits in the order they should be tried
+    def order(self, jumps: list, bits: int, geometry=ENGLISH) -> list:
+        if self.ordering == "centre":
+            return sorted(jumps, key=_centre_distance(geometry).__getitem__)
+        if self.ordering == "mobility":
+            find_jumps = geometry.find_jumps
+            return sorted(jumps, key=lambda mask: len(find_jumps(bits ^ mask)))
+        return jumps
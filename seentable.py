@@ -0,0 +1,94 @@
+from array import array
+
+# SeenTable is the solver's record of boards it has already seen. It is an open-addressing
+# hash table (linear probing) of 64-bit slots in a flat array, so each board costs 8 bytes
+# (16 at the worst load), instead of a Python int in a set or dict.
+# Each slot packs a small value (e.g. the best peg count for that board) in the top byte,
+# and key + 1 in the rest, so an all-zero slot means empty.
+#
+# If max_entries is given, the table holds at most that many boards (so it never grows past
+# the next power of two above 2 * max_entries slots), and when it fills up it switches to a
+# lossy mode: a new board replaces the board in its home slot.
+# Boards can then be forgotten (and searched again), but a board is never wrongly
+# reported as seen, so the solver stays correct with bounded, predictable memory.
+KEY_BITS = 56
+KEY_MASK = (1 << KEY_BITS) - 1
+MIN_CAPACITY = 1 << 10
+_HASH_MULTIPLIER = 0x9E3779B97F4A7C15 # Fibonacci hashing, to spread out the canonical keys
+
+
+class SeenTable():
+    def __init__(self, max_entries=None, capacity=MIN_CAPACITY):
+        self.max_entries = max_entries
+        if max_entries is not None: # no need for more room than a full table takes
+            capacity = min(capacity, 1 << max(1, (2 * max_entries - 1).bit_length()))
+        self.count = 0
+        self.lossy = False
+        self.__allocate(capacity)
+
+    def __allocate(self, capacity):
+        self.capacity = capacity
+        self.shift = 64 - (capacity.bit_length() - 1)
+        self.slots = array("Q", bytes(8 * capacity))
+
+    def __len__(self):
+        return self.count
+
+    def __home(self, stored):
+        return ((stored * _HASH_MULTIPLIER) & 0xFFFFFFFFFFFFFFFF) >> self.shift
+
+    # __find returns the index of the slot holding key, or of the empty slot where it would go.
+    # Tables are kept at most half full, so there is always an empty slot to stop at.
+    def __find(self, stored):
+        slots = self.slots
+        mask = self.capacity - 1
+        i = self.__home(stored)
+        while True:
+            slot = slots[i]
+            if slot == 0 or slot & KEY_MASK == stored:
+                return i
+            i = (i + 1) & mask
+
+    def __contains__(self, key: int) -> bool:
+        return self.slots[self.__find(key + 1)] != 0
+
+    # get returns the value stored with key, or default if key hasn't been seen
+    def get(self, key: int, default=None):
+        slot = self.slots[self.__find(key + 1)]
+        return default if slot == 0 else slot >> KEY_BITS
+
+    def add(self, key: int):
+        self.put(key, 0)
+
+    def put(self, key: int, value: int):
+        stored = key + 1
+        i = self.__find(stored)
+        if self.slots[i] == 0 and not self.lossy:
+            if self.max_entries is not None and self.count >= self.max_entries:
+                self.lossy = True
+            elif self.count >= self.capacity // 2:
+                self.__grow()
+                i = self.__find(stored)
+        if self.slots[i] == 0:
+            if self.lossy:
+                # Replace whatever is in the home slot. It stays non-empty, so every other
+                # board's probe sequence still works. If the home slot is empty, the table
+                # is already as full as it is allowed to get, so the board is just dropped.
+                i = self.__home(stored)
+                if self.slots[i] == 0:
+                    return
+            else:
+                self.count += 1
+        self.slots[i] = (value << KEY_BITS) | stored
+
+    # __grow doubles the table, and puts every board back in its new slot
+    def __grow(self):
+        old_slots = self.slots
+        self.__allocate(self.capacity * 2)
+        slots = self.slots
+        for slot in old_slots:
+            if slot:
+                slots[self.__find(slot & KEY_MASK)] = slot
+
+    def nbytes(self) -> int:
+        return self.capacity * self.slots.itemsize
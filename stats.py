@@ -0,0 +1,79 @@
+import time
+try:
+    import resource
+except ImportError: # Windows has no resource module, so peak memory isn't measured there
+    resource = None
+
+# SolveStats records what a solver did, and is returned alongside the solution.
+# - moves: every jump tried, and duplicates: the jumps that reached an already seen board
+#   (in any orientation). pruned is the jumps skipped by the pruning layer (see pruning.py).
+# - nodes_per_depth[d]: the jumps tried from boards d jumps away from the start.
+# - seen_sizes: (moves, boards remembered) samples, taken at every progress tick.
+# - iteration_times: (npegs, seconds) for each npegs the solver searched for. A single pass
+#   solve has one entry, for the peg count it found.
+# - peak_seen_bytes: the most memory the seen tables took, and peak_rss_mb the peak memory of
+#   the whole process (None where it can't be measured).
+class SolveStats():
+    def __init__(self, depths=0):
+        self.started = time.perf_counter()
+        self.elapsed = 0.0
+        self.moves = 0
+        self.duplicates = 0
+        self.pruned = 0
+        self.nodes_per_depth = [0] * depths
+        self.seen_sizes = []
+        self.iteration_times = []
+        self.peak_seen_bytes = 0
+        self.peak_rss_mb = None
+
+    def duplicate_rate(self) -> float:
+        return self.duplicates / self.moves if self.moves else 0.0
+
+    # depths returns nodes_per_depth, without the depths that were never reached
+    def depths(self) -> list:
+        depths = list(self.nodes_per_depth)
+        while depths and depths[-1] == 0:
+            depths.pop()
+        return depths
+
+    # sample records the size of the seen tables, at the current move count
+    def sample(self, *tables):
+        self.seen_sizes.append((self.moves, sum(len(table) for table in tables)))
+        self.peak_seen_bytes = max(self.peak_seen_bytes, sum(table.nbytes() for table in tables))
+
+    def finish(self):
+        self.elapsed = time.perf_counter() - self.started
+        if resource is not None:
+            peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+            self.peak_rss_mb = max(self.peak_rss_mb or 0, peak)
+
+    # merge adds in the stats of a search that started depth jumps further on (see parallel.py)
+    def merge(self, other, depth=0):
+        self.moves += other.moves
+        self.duplicates += other.duplicates
+        self.pruned += other.pruned
+        if len(self.nodes_per_depth) < depth + len(other.nodes_per_depth):
+            self.nodes_per_depth += [0] * (depth + len(other.nodes_per_depth) - len(self.nodes_per_depth))
+        for d, nodes in enumerate(other.nodes_per_depth):
+            self.nodes_per_depth[depth + d] += nodes
+        self.peak_seen_bytes = max(self.peak_seen_bytes, other.peak_seen_bytes)
+        if other.peak_rss_mb is not None:
+            self.peak_rss_mb = max(self.peak_rss_mb or 0, other.peak_rss_mb)
+
+    def summary(self) -> str:
+        return (f"{self.moves:,} moves in {self.elapsed:.2f}s\n"
+                f"{self.duplicate_rate():.0%} reached a board already seen")
+
+    def to_dict(self) -> dict:
+        return {
+            "elapsed": self.elapsed,
+            "moves": self.moves,
+            "duplicates": self.duplicates,
+            "duplicate_rate": self.duplicate_rate(),
+            "pruned": self.pruned,
+            "nodes_per_depth": self.depths(),
+            "seen_sizes": self.seen_sizes,
+            "iteration_times": self.iteration_times,
+            "peak_seen_bytes": self.peak_seen_bytes,
+            "peak_rss_mb": self.peak_rss_mb,
+        }
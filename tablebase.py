@@ -0,0 +1,119 @@
+import argparse
+import os
+import time
+import numpy as np
+from constants import SOLITAIRE
+from bitboard import grid_to_bits, bits_to_grid, count_pegs, find_jumps, canonical, replay, move_of
+from frontier import Frontier, layers as frontier_layers
+
+# A tablebase stores, for every board reachable from the start board (one per canonical key),
+# the fewest pegs that can be left from it. It is built once, offline, with:
+#     python -m tablebase
+# and then memory-mapped at runtime, so that Hint and Solve are a chain of lookups.
+# It is saved as two files next to each other, path.keys.npy and path.best.npy: the sorted
+# canonical keys (as uint64), and the best peg count for each key (as uint8). A lookup is then a
+# binary search in the memory-mapped keys, which only reads the few pages it touches.
+# (A single array of (key, best) records would make numpy copy the whole key column on each search.)
+TABLEBASE_PATH = "tablebase"
+KEY_DTYPE = np.dtype("<u8")
+BEST_DTYPE = np.dtype("u1")
+# How many boards to expand at a time in the backward pass, to keep memory in check
+CHUNK_SIZE = 100_000
+
+
+# _forward finds every canonical board reachable from start, one layer per peg count.
+# Returns a dict of peg count -> sorted array of canonical keys.
+# Both passes expand whole arrays of boards at a time (see frontier.py).
+def _forward(start: int) -> dict:
+    layers = {}
+    for pegs, layer in frontier_layers(start):
+        layers[pegs] = layer
+        print(f"{pegs} pegs: {len(layer)} boards")
+    return layers
+
+
+# _backward works out the best peg count for each layer in turn, starting from the fewest pegs.
+# Every child of a board in a layer is in the layer below, which has already been worked out.
+def _backward(layers: dict) -> dict:
+    frontier = Frontier()
+    values = {}
+    for pegs in sorted(layers):
+        keys = layers[pegs]
+        best = np.full(len(keys), pegs, dtype=np.uint8) # A board with no moves is stuck with its pegs
+        if pegs - 1 in values:
+            lower_keys, lower_best = layers[pegs - 1], values[pegs - 1]
+            for start in range(0, len(keys), CHUNK_SIZE):
+                children, parents = frontier.expand(keys[start:start + CHUNK_SIZE])
+                if len(children):
+                    idx = np.searchsorted(lower_keys, frontier.canonical(children))
+                    np.minimum.at(best, parents + start, lower_best[idx])
+        values[pegs] = best
+    return values
+
+
+def _keys_path(path) -> str:
+    return f"{path}.keys.npy"
+
+def _best_path(path) -> str:
+    return f"{path}.best.npy"
+
+
+# build does a retrograde analysis of every board reachable from grid, and saves it to path
+def build(grid=SOLITAIRE, path=TABLEBASE_PATH):
+    started = time.time()
+    layers = _forward(grid_to_bits(grid))
+    values = _backward(layers)
+    keys = np.concatenate([layers[pegs] for pegs in sorted(layers)]).astype(KEY_DTYPE)
+    best = np.concatenate([values[pegs] for pegs in sorted(layers)]).astype(BEST_DTYPE)
+    order = np.argsort(keys, kind="stable")
+    np.save(_keys_path(path), keys[order])
+    np.save(_best_path(path), best[order])
+    print(f"Saved {len(keys)} boards to {path} in {time.time() - started:.1f}s")
+
+
+class Tablebase():
+    def __init__(self, path=TABLEBASE_PATH):
+        self.keys = np.load(_keys_path(path), mmap_mode="r")
+        self.best = np.load(_best_path(path), mmap_mode="r")
+
+    # lookup returns the fewest pegs that can be left from bits, or None if bits isn't in the table.
+    # The key has to be a np.uint64, or searchsorted converts the whole array to compare with it.
+    def lookup(self, bits: int):
+        key = np.uint64(canonical(bits))
+        idx = int(np.searchsorted(self.keys, key))
+        if idx < len(self.keys) and self.keys[idx] == key:
+            return int(self.best[idx])
+        return None
+
+    # solve returns the same list of grids as Board.solve, by always moving to a board that does
+    # as well as the current one. Returns None if the board isn't in the table.
+    def solve(self, grid):
+        start = grid_to_bits(grid)
+        npegs = self.lookup(start)
+        if npegs is None:
+            return None
+        bits = start
+        moves = []
+        while count_pegs(bits) > npegs:
+            for mask in find_jumps(bits):
+                if self.lookup(bits ^ mask) == npegs:
+                    moves.append(move_of(bits, mask))
+                    bits ^= mask
+                    break
+        if not moves:
+            return []
+        return [bits_to_grid(bits) for bits in replay(start, moves)]
+
+
+# load_tablebase returns the tablebase at path, or None if it hasn't been built
+def load_tablebase(path=TABLEBASE_PATH):
+    if not (os.path.exists(_keys_path(path)) and os.path.exists(_best_path(path))):
+        return None
+    return Tablebase(path)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build the peg solitaire tablebase for the standard board")
+    parser.add_argument("--output", default=TABLEBASE_PATH, help="where to save the tablebase (as OUTPUT.keys.npy and OUTPUT.best.npy)")
+    args = parser.parse_args()
+    build(path=args.output)
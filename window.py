@@ -2,15 +2,22 @@ from tkinter import *
 import tkinter as tk
 from tkinter import ttk
 from tkinter import messagebox
+from tkinter import filedialog
 from board import Board
 import numpy as np
 from constants import SOLITAIRE, EMPTY_BOARD, GRID_SIZE, ANIMATION_SPEED
-import juliacall
-from juliacall import Main as jl
-from juliacall import Pkg as jlPkg
+from tablebase import load_tablebase
+from history import GameHistory
+from bitboard import HOLES, HOLE_INDEX, grid_to_bits, bits_to_grid, moves_between
+from worker import SolveWorker, python_solve
+import julia_engine
 
-jlPkg.activate("./SolSolver")
-jl.seval("using SolSolver")
+# How often (in ms) the window checks on the background solver
+POLL_INTERVAL = 100
+# Saved games are small text files (see history.py)
+SAVED_GAME_TYPES = [("Saved games", "*.peg"), ("All files", "*")]
+# How often (in ms) the animation moves on a frame
+FRAME_INTERVAL = 15
 
 class Window():
     def __init__(self, root):
@@ -19,42 +26,43 @@ class Window():
         self.mainframe = ttk.Frame(self.root)
         self.mainframe.grid(column=0, row=0, sticky=(N, W, E, S))
         self.game_over = False
+        self.tablebase = load_tablebase() # None, unless it has been built with `python -m tablebase`
         self.init_board()
         self.init_controls()
+        # Start Julia once the window is up, so it doesn't hold up the window appearing
+        self.root.after_idle(julia_engine.start)
         self.root.mainloop()
 
+    # The board is drawn on a single Canvas. The holes are drawn once, and each peg is an oval
+    # on top of them, so moving a peg is just moving its oval.
     def init_board(self):
-        self.boardframe = ttk.Frame(self.mainframe)
-        self.boardframe.grid(column=0, row=0, sticky=(N, W, E, S))
+        (rows, cols) = EMPTY_BOARD.shape
+        self.canvas = Canvas(self.mainframe, height=rows * GRID_SIZE, width=cols * GRID_SIZE, highlightthickness=0)
+        self.canvas.grid(column=0, row=0, sticky=(N, W, E, S))
         self.root.columnconfigure(0, weight=1)
         self.root.rowconfigure(0, weight=1)
-        self.board = Board(SOLITAIRE)
-        self.board.static = False # The pegs can be dragged
-        self.empty_board = Board(EMPTY_BOARD)
-        self.empty_board.static = True # This will remain the same throughout
-        self._drag_start_x = 0
-        self._drag_start_y = 0
-        self.widget_map = {}
-        # Adding support for history, to enable moving through it using the arrow keys
-        self.history = [self.board.grid.copy()]
-        self.future = [] # This will be used to store future moves, if we go back in history
-        self.draw_grid(self.empty_board)
-        self.draw_grid(self.board)
-        # self.animation_finished = True  # To track if any animation is in progress
+        self.board = Board(SOLITAIRE.copy()) # Moves are made on the grid in place
+        self._drag_x = 0
+        self._drag_y = 0
+        self.peg_items = {} # (row, col) -> the peg's canvas item
+        self.animation = None # The moves still to be animated, and the one being animated now
+        # Adding support for history, to enable moving through it using the arrow keys.
+        # It keeps just the moves, so going back (or forward) is one move away (see history.py)
+        self.history = GameHistory(grid_to_bits(self.board.grid))
+        for (r, c) in HOLES:
+            self.canvas.create_oval(*self.cell_box(r, c, 10)) # The hole for the peg
+        self.canvas.tag_bind("peg", "<Button-1>", self.drag_start)
+        self.canvas.tag_bind("peg", "<B1-Motion>", self.drag_motion)
+        self.canvas.tag_bind("peg", "<ButtonRelease-1>", self.drag_end)
+        self.draw_pegs()
 
     def reset_board(self, grid=None, reset_history=False):
         grid = SOLITAIRE if grid is None else grid
-        self.board = Board(grid)
-        self.board.static = False
-        for peg in self.widget_map:
-            if self.widget_map[peg]:
-                self.widget_map[peg].destroy()
-        self.widget_map = {}
-        # Also reset the history and future if needed
+        self.board = Board(grid.copy())
+        # Also reset the history if needed
         if reset_history:
-            self.history = [self.board.grid.copy()]
-            self.future = []
-        self.draw_grid(self.board)
+            self.history = GameHistory(grid_to_bits(self.board.grid))
+        self.draw_pegs()
 
     def init_controls(self):
         controls = ttk.Frame(self.mainframe)
@@ -65,45 +73,83 @@ class Window():
         solve_button.grid(column=0, row=1, padx=5, pady=5)
         hint_button = ttk.Button(controls, text="Hint", command=lambda: self.solve_board(hint=True))
         hint_button.grid(column=0, row=2, padx=5, pady=5)
+        save_button = ttk.Button(controls, text="Save", command=self.save_game)
+        save_button.grid(column=0, row=3, padx=5, pady=5)
+        load_button = ttk.Button(controls, text="Load", command=self.load_game)
+        load_button.grid(column=0, row=4, padx=5, pady=5)
+        # How the last solve went (see stats.py)
+        self.stats_text = tk.StringVar()
+        ttk.Label(controls, textvariable=self.stats_text, justify=LEFT).grid(column=0, row=5, padx=5, pady=5)
         self.root.bind("<Left>", self.prev_move)
         self.root.bind("<Right>", self.next_move)
 
     def prev_move(self, _event=None):
-        if len(self.history) <= 1:
+        if self.animation: # wait for the animation to finish
+            return
+        last_move = self.history.undo()
+        if last_move is None:
             messagebox.showinfo(message="No previous moves to go back to!")
             return
-        # Pop the last move from history, and push it to future
-        last_move = self.history.pop()
-        self.future.append(last_move)
-        # Now set the board to the last move in history
-        self.board.grid = self.history[-1]
-        init_peg, jump_peg, final_peg = self.get_pegs(self.board.grid, last_move)
-        # Destroy / Recreate the pegs at the correct locations
-        # Since there is no animation, destroying the final peg is ok. 
-        final_widget = self.widget_map[final_peg]
-        final_widget.destroy()
-        self.widget_map[final_peg] = None  # Remove the final peg from the widget map
-        self.make_peg(init_peg[0], init_peg[1], self.board.static)
-        self.make_peg(jump_peg[0], jump_peg[1], self.board.static)
-        self.root.update_idletasks() 
+        # Take the move back on the board
+        self.board.unmake_move(last_move)
+        init_peg, jump_peg, final_peg = (HOLES[i] for i in last_move)
+        # Put the peg back where it came from, and put back the peg it jumped over.
+        # There is no animation going back.
+        self.move_peg(final_peg, init_peg)
+        self.make_peg(*jump_peg)
 
     def next_move(self, _event=None):
-        if not self.future:
+        if self.animation:
+            return
+        next_move = self.history.redo()
+        if next_move is None:
             messagebox.showinfo(message="No future moves to go to!")
             return
-        # Pop the last move from future, and push it to history
-        next_move = self.future.pop()
-        self.history.append(next_move)
+        self.animation_wrapper([next_move])
 
-        self.animation_wrapper([self.board.grid, next_move])
+    def save_game(self):
+        path = filedialog.asksaveasfilename(defaultextension=".peg", filetypes=SAVED_GAME_TYPES)
+        if not path:
+            return
+        try:
+            self.history.save(path)
+        except OSError as e:
+            messagebox.showerror(message=f"Couldn't save the game: {e}")
+
+    # load_game replaces the game with a saved one, at the move it was saved at
+    def load_game(self):
+        path = filedialog.askopenfilename(filetypes=SAVED_GAME_TYPES)
+        if not path:
+            return
+        try:
+            history = GameHistory.load(path)
+        except (OSError, ValueError) as e:
+            messagebox.showerror(message=f"Couldn't load the game: {e}")
+            return
+        self.history = history
+        self.game_over = False
+        self.reset_board(bits_to_grid(history.bits))
 
     def solve_board(self, hint=False):
         if np.sum(self.board.grid == 1) == 1:
             messagebox.showinfo(message="Game already solved!")
             return
-        # - This was the Python solution...
-        # solution = self.board.solve() 
-        # Instead, let's use Julia to make the solver Fasterrrrr
+        # If the board is in the tablebase, the solution is just a chain of lookups
+        if self.tablebase:
+            solution = self.tablebase.solve(self.board.grid)
+            if solution is not None:
+                self.stats_text.set("Tablebase:\nlooked up")
+                self.show_solution(solution, hint)
+                return
+
+        # Julia makes the solver Fasterrrrr, but if it isn't ready yet (or isn't installed),
+        # fall back on the Python solver rather than keep the user waiting.
+        # The solver runs in a background thread, so the window (and the Cancel button) keep working
+        if julia_engine.ready():
+            engine, solve = "Julia", julia_engine.solve
+        else:
+            engine, solve = "Python", python_solve
+        worker = SolveWorker(solve, self.board.grid.copy())
 
         # Warn the user that solving is in progress, and take control away..         
         loading_dialog = tk.Toplevel(self.root)
@@ -113,213 +159,173 @@ class Window():
         root_w = self.root.winfo_width()
         root_h = self.root.winfo_height()
         dialog_w = 250
-        dialog_h = 100
+        dialog_h = 130
         pos_x = root_x + (root_w // 2) - (dialog_w // 2)
         pos_y = root_y + (root_h // 2) - (dialog_h // 2)
         loading_dialog.geometry(f"{dialog_w}x{dialog_h}+{pos_x}+{pos_y}")
         loading_dialog.transient(self.root)
         loading_dialog.grab_set()
         loading_dialog.resizable(False, False)
+        loading_dialog.protocol("WM_DELETE_WINDOW", worker.cancel) # Closing the dialog also cancels
 
+        progress_text = tk.StringVar(value=f"Solving with {engine}, please wait...")
         tk.Label(
             loading_dialog,
-            text="Solving, please wait...",
-        ).grid(row=0, column=0, padx=20, pady=20)
-        self.root.update_idletasks()
+            textvariable=progress_text,
+        ).grid(row=0, column=0, padx=20, pady=10)
+        ttk.Button(loading_dialog, text="Cancel", command=worker.cancel).grid(row=1, column=0, pady=5)
 
-        # Convert the board to a Julia matrix
-        jl_matrix = juliacall.convert(jl.Matrix[jl.Int64], self.board.grid)
-        # And get Julia to solve it. The function being used (solver) is defined in the Julia package SolSolver
-        solution = jl.solve(jl_matrix)
+        worker.start()
+        self.root.after(POLL_INTERVAL, lambda: self.poll_solver(worker, loading_dialog, progress_text, engine, hint))
+
+    # poll_solver checks on the background solver every POLL_INTERVAL ms, until it is done
+    def poll_solver(self, worker, loading_dialog, progress_text, engine, hint):
+        if not worker.done():
+            if worker.cancelled():
+                progress_text.set("Cancelling...")
+            else:
+                progress_text.set(f"Solving with {engine}, please wait...\nMoves made: {worker.moves():,}")
+            self.root.after(POLL_INTERVAL, lambda: self.poll_solver(worker, loading_dialog, progress_text, engine, hint))
+            return
 
         # Now we can close the solving dialog
         loading_dialog.destroy()
-        
-        # Convert the solution (Julia list of Julia matrices) to a Python list of numpy arrays
-        # And send it to be animated
-        if solution:
-            py_solution = []
-            for solution_step in solution:
-                py_solution.append(solution_step.to_numpy())
+        if worker.error:
+            messagebox.showerror(message=f"The solver failed: {worker.error}")
+            return
+        if worker.cancelled():
+            return
+        self.stats_text.set(f"{engine}:\n{worker.stats.summary()}")
+        self.show_solution(worker.solution, hint)
+
+    # show_solution animates a solution (a list of grids, from a solver), and adds its moves to the history
+    def show_solution(self, solution, hint=False):
+        moves = moves_between([grid_to_bits(grid) for grid in solution])
+        if moves:
             if hint:
                 # If this is a "hint" call, we only want to highlight the pegs to be moved.
-                py_solution = py_solution[0:2]
-            self.animation_wrapper(py_solution)
-            self.history += py_solution[1:]
+                moves = moves[0:1]
+            self.history.extend(moves)
+            self.animation_wrapper(moves)
             if hint:
-                self.future = []
                 self.root.after(ANIMATION_SPEED * 50, self.prev_move)  # Reset the board after a delay
                 
     # Methods below are for drawing and updating the board
-    def make_draggable(self, widget):
-        """Makes a widget draggable."""
-        widget.bind("<Button-1>", self.drag_start)
-        widget.bind("<B1-Motion>", self.drag_motion)
-        widget.bind("<ButtonRelease-1>", self.drag_end)
+    # cell_box returns the corners of the circle in cell (row, col), inset pixels in from the edge of the cell
+    def cell_box(self, row, col, inset):
+        return (col * GRID_SIZE + inset, row * GRID_SIZE + inset,
+                (col + 1) * GRID_SIZE - inset, (row + 1) * GRID_SIZE - inset)
+
+    def draw_pegs(self):
+        self.canvas.delete("peg")
+        self.peg_items = {}
+        for (r, c) in HOLES:
+            if self.board.grid[r, c] == 1:
+                self.make_peg(r, c)
+
+    def make_peg(self, row, col):
+        self.peg_items[(row, col)] = self.canvas.create_oval(*self.cell_box(row, col, 5), fill="teal", tags="peg")
+
+    # move_peg moves the peg in cell init to cell final (lined up exactly)
+    def move_peg(self, init, final):
+        item = self.peg_items.pop(init)
+        self.canvas.coords(item, *self.cell_box(*final, 5))
+        self.peg_items[final] = item
+
+    def remove_peg(self, cell):
+        self.canvas.delete(self.peg_items.pop(cell))
+
+    # cell_at returns the (row, col) of the cell under the centre of a canvas item
+    def cell_at(self, item):
+        (x0, y0, x1, y1) = self.canvas.coords(item)
+        return (int((y0 + y1) / 2 // GRID_SIZE), int((x0 + x1) / 2 // GRID_SIZE))
 
     def drag_start(self, event):
-        widget = event.widget
-        Misc.lift(widget)
-        self._drag_start_x = event.x
-        self._drag_start_y = event.y
-        x = widget.winfo_x() - self._drag_start_x + event.x
-        y = widget.winfo_y() - self._drag_start_y + event.y
-        
-        self.board.selected_peg = [
-            round(y / GRID_SIZE),
-            round(x / GRID_SIZE)
-        ]
+        item = self.canvas.find_withtag("current")[0]
+        self.canvas.tag_raise(item)
+        self._drag_x = event.x
+        self._drag_y = event.y
+        self.board.selected_peg = list(self.cell_at(item))
         self.board.find_available_locs()
-        # print(self.available_locs)
 
     def drag_motion(self, event):
-        widget = event.widget
-        x = widget.winfo_x() - self._drag_start_x + event.x
-        y = widget.winfo_y() - self._drag_start_y + event.y
-        widget.place(x=x, y=y)
+        self.canvas.move(self.peg_items[tuple(self.board.selected_peg)], event.x - self._drag_x, event.y - self._drag_y)
+        self._drag_x = event.x
+        self._drag_y = event.y
 
     # Drag_end has to do a lot of work:
     # 1/ Figure out where the dragging has ended
     # 2/ See if that's a valid location. If it is, then update the grid, and do the peg removals
     # 3/ If not a valid location, return the peg to its starting location
     # 4/ Check if the game is over
-    def drag_end(self, event):
-        [r, c] = self.board.selected_peg
-        widget = event.widget
-        x = widget.winfo_x() - self._drag_start_x + event.x
-        y = widget.winfo_y() - self._drag_start_y + event.y
-
+    def drag_end(self, _event):
+        (r, c) = self.board.selected_peg
         # Determine the location we're dragging to in grid coords
-        final_r = round(y / GRID_SIZE)
-        final_c = round(x / GRID_SIZE)
-        # print(f"moving to: {final_r, final_c}")
-        
+        (final_r, final_c) = self.cell_at(self.peg_items[(r, c)])
+
         if (final_r, final_c) in self.board.available_locs: # If this is a valid move
-            # Update the grid to reflect the move
-            new_grid = self.board.grid.copy()
             # Locate the jump peg (easy because we kept track)
             (to_remove_r, to_remove_c) = self.board.available_locs[(final_r, final_c)]
-            new_grid[final_r, final_c] = 1
-            new_grid[to_remove_r, to_remove_c] = 0
-            new_grid[r, c] = 0
-            self.board.grid = new_grid
-            self.history.append(self.board.grid)  # Update the history with the new grid
-            self.future = []  # Clear the future moves, as we have a new move
-            # print(self.history)
-            self.widget_map[(to_remove_r, to_remove_c)].destroy()
+            move = (HOLE_INDEX[(r, c)], HOLE_INDEX[(to_remove_r, to_remove_c)], HOLE_INDEX[(final_r, final_c)])
+            # Update the grid to reflect the move
+            self.board.make_move(move)
+            self.history.push(move)  # Update the history. This also drops any moves we went back over
+            self.remove_peg((to_remove_r, to_remove_c))
         else:
             (final_r, final_c) = (r, c)
 
-        # Now - to get perfect alignment, we destroy the peg, and recreate it at the final_loc.
+        # Line the peg up exactly in its cell.
         # If the jump didn't succeed, then the final loc is the same as the starting loc
-        widget.destroy()
-        self.make_peg(final_r, final_c, self.board.static)
+        self.move_peg((r, c), (final_r, final_c))
         # The below should ensure "Game over" message only pops up once
         if not self.game_over:
             self.check_game_end()
 
-    def draw_grid(self, board:Board):
-        for r, row_data in enumerate(board.grid):
-            for c, cell_data in enumerate(row_data):
-                if cell_data == 1:
-                    self.make_peg(r, c, board.static)
-
-    def make_peg(self, row, col, static:bool):
-        # We'll create a new widget for each circle
-        widget = Canvas(self.boardframe, height=GRID_SIZE, width=GRID_SIZE)
-        if static:
-            widget.create_oval(10, 10, GRID_SIZE-10, GRID_SIZE-10) # The hole for the peg
-        else:
-            widget.create_oval(5, 5, GRID_SIZE-5, GRID_SIZE-5, fill="teal")
-            self.make_draggable(widget)
-            self.widget_map[(row, col)] = widget # To help select and destroy it later
-        widget.grid(row=row, column=col, padx=0, pady=0)
-        # print(widget.winfo_x(), widget.winfo_y())
-
     def check_game_end(self):
         if not self.board.find_moves():
             npegs = np.sum(self.board.grid == 1)
             messagebox.showinfo(message=f"Game Over!\nNumber of pegs left: {npegs}")
             self.game_over = True
 
-    def animation_wrapper(self, solution):
+    def animation_wrapper(self, moves):
         # This method first takes away control from the window to prevent user interaction during animation
         # Then it starts the animation
         controller_widget = tk.Toplevel(self.root)
         controller_widget.grab_set()  # Prevent interaction with the main window during animation
-        # controller_widget.lift()  # Keep the controller widget on top
         Misc.lower(controller_widget)  # Lower it to avoid focus issues
-        self.animate_solution(solution, controller_widget=controller_widget)
-
-    def animate_solution(self, solution, controller_widget, idx=0):
-        # print(idx)
-        if idx >= len(solution) - 1:
-            self.root.after(ANIMATION_SPEED * 10, lambda: controller_widget.destroy())
-            return
-        init_grid = solution[idx]
-        final_grid = solution[idx + 1]
-        self.animate_move_with_callback(init_grid, final_grid, lambda: self.animate_solution(solution, controller_widget, idx + 1))
-        self.board.grid = final_grid
-        # if self.animation_finished:
-        #     controller_widget.destroy()
-    
-    def animate_move_with_callback(self, init_grid, final_grid, callback):
-        init_peg, jump_peg, final_peg = self.get_pegs(init_grid, final_grid)
-        self.make_peg(final_peg[0], final_peg[1], False)
-        final_widget = self.widget_map[final_peg]
-        Misc.lower(final_widget)
-
-        # This is required - to ensure the peg actually gets drawn... took help from Gemini
-        self.boardframe.update_idletasks()
-        init_widget = self.widget_map[init_peg]
-        jump_widget = self.widget_map[jump_peg]
-        self.animate_widget_with_callback(init_widget, jump_widget, final_widget, callback)
-        self.widget_map[init_peg] = None
-        self.widget_map[jump_peg] = None
-
-    def animate_widget_with_callback(self, init_widget, jump_widget, final_widget, callback, speed=ANIMATION_SPEED):
-        Misc.lift(init_widget)
-        current_x = init_widget.winfo_x()
-        current_y = init_widget.winfo_y()
+        self.animation = [iter(moves), None, controller_widget]
+        self.root.after(FRAME_INTERVAL, self.animate_frame)
 
-        target_x = final_widget.winfo_x()
-        target_y = final_widget.winfo_y()
+    # animate_frame moves the animation on by one frame: the peg being animated moves ANIMATION_SPEED
+    # pixels towards its hole. When it gets there, the next move starts on the next frame.
+    # A single timer drives the whole animation, however many moves it has.
+    def animate_frame(self):
+        (moves, current, controller_widget) = self.animation
+        if current is None:
+            move = next(moves, None)
+            if move is None: # all done, give control back after a short delay
+                self.animation = None
+                self.root.after(ANIMATION_SPEED * 10, controller_widget.destroy)
+                return
+            self.board.make_move(move)
+            init_peg, jump_peg, final_peg = (HOLES[i] for i in move)
+            item = self.peg_items.pop(init_peg)
+            self.peg_items[final_peg] = item
+            self.canvas.tag_raise(item)
+            current = self.animation[1] = (item, jump_peg, final_peg)
 
-        dx = target_x - current_x
-        dy = target_y - current_y
+        (item, jump_peg, final_peg) = current
+        (x, y) = self.canvas.coords(item)[:2]
+        (target_x, target_y) = self.cell_box(*final_peg, 5)[:2]
+        dx = target_x - x
+        dy = target_y - y
         distance = (dx**2 + dy**2)**0.5
-
-        if distance < speed:
-            # Instead of using widget.destroy(), we will hide the widgets, and remove them from the widget_map
-            # This removes some weird Tcl bugs with the animation, due to callbacks being called after the widget is destroyed
-            Misc.lower(init_widget)
-            Misc.lower(jump_widget)
-            Misc.lift(final_widget)
-            if callback:
-                final_widget.after(500 // ANIMATION_SPEED, callback)  # Call the callback after a short delay
-            return
-        
-        # Calculate the next step's position
-        # Move 'speed' pixels in the direction of the target
-        next_x = current_x + (dx / distance) * speed
-        next_y = current_y + (dy / distance) * speed
-        
-        init_widget.place(x=next_x, y=next_y)
-
-        # Schedule the next frame of the animation after a short delay
-        init_widget.after(15, lambda: self.animate_widget_with_callback(
-            init_widget, jump_widget, final_widget, callback, speed))
-        
-    def get_pegs(self, init_grid, final_grid):
-        delta_grid = final_grid - init_grid
-        final_loc = np.nonzero(delta_grid == 1)
-        final_peg = final_loc[0][0], final_loc[1][0]
-
-        removed_indices = np.nonzero(delta_grid == -1)
-        ind1_r, ind1_c = removed_indices[0][0], removed_indices[1][0]
-        ind2_r, ind2_c = removed_indices[0][1], removed_indices[1][1]
-
-        dist_ind1_final_loc = abs(ind1_r-final_peg[0]) + abs(ind1_c-final_peg[1])
-        jump_peg = (ind1_r, ind1_c) if dist_ind1_final_loc == 1 else (ind2_r, ind2_c)
-        init_peg = (ind1_r, ind1_c) if dist_ind1_final_loc == 2 else (ind2_r, ind2_c)
-        return init_peg, jump_peg, final_peg
\ No newline at end of file
+        if distance <= ANIMATION_SPEED:
+            # Arrived: line the peg up exactly, and take away the peg it jumped over
+            self.canvas.move(item, dx, dy)
+            self.remove_peg(jump_peg)
+            self.animation[1] = None
+        else:
+            # Move 'speed' pixels in the direction of the target
+            self.canvas.move(item, dx / distance * ANIMATION_SPEED, dy / distance * ANIMATION_SPEED)
+        self.root.after(FRAME_INTERVAL, self.animate_frame)
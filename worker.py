@@ -0,0 +1,62 @@
+import threading
+import numpy as np
+from board import Board, SolveCancelled
+
+# SolveWorker runs a solver in a background thread, so the window stays responsive while it works.
+# The solver shares a small status array with the worker (and, through it, the window):
+# status[MOVES] is the number of moves made so far, written by the solver, and
+# status[CANCEL] is set to 1 to ask the solver to stop. Once the solver is done,
+# status[DUPLICATES] is the number of moves that led to an already seen board.
+# Being a plain numpy array, the Julia solver can update it in place too.
+# The full statistics of the solve (see stats.py) come back with the solution.
+MOVES = 0
+CANCEL = 1
+DUPLICATES = 2
+
+
+class SolveWorker():
+    # solve is called as solve(grid, status) in the background thread, and returns the list of grids
+    # and the SolveStats (or None, if it was cancelled)
+    def __init__(self, solve, grid):
+        self.status = np.zeros(3, dtype=np.int64)
+        self.solution = None
+        self.stats = None
+        self.error = None
+        self.thread = threading.Thread(target=self.__run, args=(solve, grid), daemon=True)
+
+    def __run(self, solve, grid):
+        try:
+            self.solution, self.stats = solve(grid, self.status)
+        except Exception as e: # Handed back to the window, which reports it
+            self.error = e
+
+    def start(self):
+        self.thread.start()
+
+    def cancel(self):
+        self.status[CANCEL] = 1
+
+    def cancelled(self) -> bool:
+        return self.status[CANCEL] != 0
+
+    def done(self) -> bool:
+        return not self.thread.is_alive()
+
+    def moves(self) -> int:
+        return int(self.status[MOVES])
+
+
+# python_solve solves the grid with Board.solve, reporting progress through status.
+# geometry is the board layout of the grid (see geometry.py), English by default.
+def python_solve(grid, status, single_pass=True, geometry=None):
+    def progress(stats):
+        status[MOVES] = stats.moves
+        return status[CANCEL] != 0
+    board = Board(grid, geometry=geometry)
+    try:
+        solution, stats = board.solve(single_pass, progress)
+    except SolveCancelled:
+        return [], None
+    status[MOVES] = stats.moves
+    status[DUPLICATES] = stats.duplicates
+    return solution, stats